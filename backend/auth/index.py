@@ -1,148 +1,110 @@
-import json
-import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from decimal import Decimal
+import instrumentation
+import compression
+import core
+import tokens
+import passwords
+import user_codes
+import login_limit
 
+USER_CODE_ATTEMPTS = 5
+
+router = core.Router('GET, POST, OPTIONS', 'Content-Type')
+
+
+def _throttled(retry_after: int) -> dict:
+    return core.error(429, 'Слишком много попыток входа, попробуйте позже', {'Retry-After': str(retry_after)})
+
+
+@router.route('POST', 'register')
+def register(request: core.Request) -> dict:
+    body = request.body
+    username = body.get('username', '').strip()
+    email = body.get('email', '').strip()
+    email_password = body.get('emailPassword', '')
+    password = body.get('password', '')
+
+    forbidden = ['admin', 'administrator', 'root', 'moderator']
+    if any(word in username.lower() for word in forbidden):
+        return core.error(400, 'Это имя пользователя запрещено')
+
+    if len(password) < 4:
+        return core.error(400, 'Пароль должен содержать минимум 4 символа')
+
+    password_hash = passwords.hash_password(password)
+    conn, cur = request.conn, request.cur
+    user = None
+    for _ in range(USER_CODE_ATTEMPTS):
+        cur.execute("""
+            INSERT INTO users (username, email, email_password, password_hash, user_code)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (user_code) DO NOTHING
+            RETURNING id, username, email, balance, user_code, level, completed_tasks, is_blocked
+        """, (username, email, email_password, password_hash, user_codes.generate()))
+        user = cur.fetchone()
+        if user:
+            break
+
+    if not user:
+        conn.rollback()
+        return core.error(503, 'Не удалось выдать код пользователя, попробуйте ещё раз')
+
+    # токен выпускается до коммита: без SESSION_SECRET регистрация откатится,
+    # а не создаст аккаунт, на который клиент получит 500 и повторит запрос
+    user_dict = dict(user)
+    token = tokens.issue(user_dict['id'], False)
+    conn.commit()
+
+    return core.ok(user=user_dict, token=token)
+
+
+@router.route('POST', 'login')
+def login(request: core.Request) -> dict:
+    body = request.body
+    username = str(body.get('username', '')).strip()
+    password = body.get('password', '')
+
+    # лимит проверяется до соединения с БД: отказы по нему не стоят Postgres ничего
+    login_keys = login_limit.keys(request.event, username)
+    retry_after = login_limit.check(login_keys)
+    if retry_after:
+        return _throttled(retry_after)
+
+    conn, cur = request.conn, request.cur
+    retry_after = login_limit.load(cur, login_keys)
+    if retry_after:
+        return _throttled(retry_after)
+    login_limit.attempt(login_keys)
+
+    cur.execute("""
+        SELECT id, username, email, balance, user_code, level, completed_tasks, is_blocked, is_admin,
+               password_hash
+        FROM users
+        WHERE username = %s
+    """, (username,))
+
+    user = cur.fetchone()
+
+    if not user or not passwords.verify_password(password, user['password_hash']):
+        login_limit.failed(cur, conn, login_keys)
+        return core.error(401, 'Неверный логин или пароль')
+
+    if user['is_blocked']:
+        return core.error(403, 'Пользователь заблокирован')
+
+    if passwords.needs_rehash(user['password_hash']):
+        cur.execute("""
+            UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s
+        """, (passwords.hash_password(password), user['id'], user['password_hash']))
+        conn.commit()
+
+    user_dict = dict(user)
+    del user_dict['password_hash']
+
+    return core.ok(user=user_dict, isAdmin=user['is_admin'], token=tokens.issue(user['id'], user['is_admin']))
+
+
+@instrumentation.instrumented('auth')
+@compression.compressed
 def handler(event: dict, context) -> dict:
     """API для регистрации и авторизации пользователей MegaCoin"""
-    
-    method = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    try:
-        dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        if method == 'POST':
-            body = json.loads(event.get('body', '{}'))
-            action = body.get('action')
-            
-            if action == 'register':
-                username = body.get('username', '').strip()
-                email = body.get('email', '').strip()
-                email_password = body.get('emailPassword', '')
-                password = body.get('password', '')
-                
-                forbidden = ['admin', 'administrator', 'root', 'moderator']
-                if any(word in username.lower() for word in forbidden):
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Это имя пользователя запрещено'}),
-                        'isBase64Encoded': False
-                    }
-                
-                if len(password) < 4:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Пароль должен содержать минимум 4 символа'}),
-                        'isBase64Encoded': False
-                    }
-                
-                import random
-                user_code = ''.join([str(random.randint(0, 9)) for _ in range(20)])
-                
-                cur.execute("""
-                    INSERT INTO users (username, email, email_password, password_hash, user_code)
-                    VALUES (%s, %s, %s, %s, %s)
-                    RETURNING id, username, email, balance, user_code, level, completed_tasks, is_blocked
-                """, (username, email, email_password, password, user_code))
-                
-                user = cur.fetchone()
-                conn.commit()
-                
-                user_dict = dict(user)
-                user_dict['balance'] = float(user_dict['balance'])
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'user': user_dict}),
-                    'isBase64Encoded': False
-                }
-            
-            elif action == 'login':
-                username = body.get('username', '').strip()
-                password = body.get('password', '')
-                
-                if username == 'admin' and password == 'stepan12':
-                    cur.execute("SELECT * FROM users WHERE username = 'admin' AND is_admin = TRUE")
-                    admin = cur.fetchone()
-                    
-                    if admin:
-                        admin_dict = dict(admin)
-                        admin_dict['balance'] = float(admin_dict['balance'])
-                        return {
-                            'statusCode': 200,
-                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                            'body': json.dumps({'user': admin_dict, 'isAdmin': True}),
-                            'isBase64Encoded': False
-                        }
-                
-                cur.execute("""
-                    SELECT id, username, email, balance, user_code, level, completed_tasks, is_blocked, is_admin
-                    FROM users
-                    WHERE username = %s AND password_hash = %s
-                """, (username, password))
-                
-                user = cur.fetchone()
-                
-                if not user:
-                    return {
-                        'statusCode': 401,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Неверный логин или пароль'}),
-                        'isBase64Encoded': False
-                    }
-                
-                if user['is_blocked']:
-                    return {
-                        'statusCode': 403,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Пользователь заблокирован'}),
-                        'isBase64Encoded': False
-                    }
-                
-                user_dict = dict(user)
-                user_dict['balance'] = float(user_dict['balance'])
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'user': user_dict, 'isAdmin': user['is_admin']}),
-                    'isBase64Encoded': False
-                }
-        
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
-    
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
\ No newline at end of file
+    return router.dispatch(event)
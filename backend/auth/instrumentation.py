@@ -0,0 +1,154 @@
+import contextvars
+import functools
+import json
+import os
+import time
+from collections import deque
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+LOG_REQUESTS = os.environ.get('LOG_REQUESTS', '1') == '1'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_WINDOW = 1000
+MAX_SAMPLE_KEYS = 64
+
+_current = contextvars.ContextVar('request_record', default=None)
+_samples = {}
+_caches = {}
+
+
+def record(field: str, seconds: float) -> None:
+    """Добавляет время к текущему запросу (connect, db)"""
+    current = _current.get()
+    if current is not None:
+        current[field] += seconds
+
+
+class _Instrumented:
+    """Считает запросы, строки и время в БД и пишет медленные запросы в лог"""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            elapsed = time.perf_counter() - started
+            current = _current.get()
+            if current is not None:
+                current['db'] += elapsed
+                current['statements'] += 1
+                current['rows'] += max(self.rowcount, 0)
+            if elapsed * 1000 >= SLOW_QUERY_MS:
+                print(json.dumps({
+                    'event': 'slow_query',
+                    'function': current and current['function'],
+                    'action': current and current['action'],
+                    'ms': round(elapsed * 1000, 2),
+                    'sql': ' '.join(str(query).split())[:500]
+                }, ensure_ascii=False))
+
+
+def __getattr__(name: str):
+    """Cursor и TupleCursor создаются при первом обращении: psycopg2 грузится, только когда запросу нужна БД"""
+    if name not in ('Cursor', 'TupleCursor'):
+        raise AttributeError(name)
+    from psycopg2 import extensions
+    from psycopg2.extras import RealDictCursor
+
+    class Cursor(_Instrumented, RealDictCursor):
+        pass
+
+    class TupleCursor(_Instrumented, extensions.cursor):
+        """Строки кортежами: для списков, которые кодирует encoder.rows"""
+
+    globals().update(Cursor=Cursor, TupleCursor=TupleCursor)
+    return globals()[name]
+
+
+def register_cache(name: str, stats) -> None:
+    """Кэш экземпляра, чья статистика (функция без аргументов -> dict) попадает в action=metrics"""
+    _caches[name] = stats
+
+
+def _action(event: dict) -> str:
+    params = event.get('queryStringParameters') or {}
+    if params.get('action'):
+        return params['action']
+    try:
+        body = json.loads(event.get('body') or '{}')
+        return body.get('action') or 'default'
+    except (ValueError, AttributeError):
+        return 'default'
+
+
+def _percentile(ordered: list, p: float) -> float:
+    return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 2)
+
+
+def metrics() -> dict:
+    """p50/p95/p99 по действиям за последние METRICS_WINDOW запросов экземпляра"""
+    import db
+    actions = {}
+    for action, samples in list(_samples.items()):
+        totals = sorted(s['total_ms'] for s in samples)
+        actions[action] = {
+            'count': len(totals),
+            'p50_ms': _percentile(totals, 50),
+            'p95_ms': _percentile(totals, 95),
+            'p99_ms': _percentile(totals, 99),
+            'avg_db_ms': round(sum(s['db_ms'] for s in samples) / len(totals), 2),
+            'avg_statements': round(sum(s['statements'] for s in samples) / len(totals), 2)
+        }
+    return {'actions': actions, 'pool': db.pool_stats(), 'caches': {name: stats() for name, stats in _caches.items()}}
+
+
+def instrumented(function_name: str):
+    """Оборачивает handler: структурированная запись на каждый запрос и GET ?action=metrics"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event: dict, context) -> dict:
+            action = _action(event)
+            headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+            if (action == 'metrics' and METRICS_TOKEN and event.get('httpMethod') == 'GET'
+                    and headers.get('x-metrics-token') == METRICS_TOKEN):
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(metrics()),
+                    'isBase64Encoded': False
+                }
+
+            current = {'function': function_name, 'action': action, 'connect': 0.0, 'db': 0.0, 'statements': 0, 'rows': 0}
+            token = _current.set(current)
+            started = time.perf_counter()
+            response = None
+            try:
+                response = handler(event, context)
+                return response
+            finally:
+                total = time.perf_counter() - started
+                _current.reset(token)
+                entry = {
+                    'event': 'request',
+                    'function': function_name,
+                    'action': action,
+                    'method': event.get('httpMethod'),
+                    'status': response['statusCode'] if response else 500,
+                    'total_ms': round(total * 1000, 2),
+                    'connect_ms': round(current['connect'] * 1000, 2),
+                    'db_ms': round(current['db'] * 1000, 2),
+                    'app_ms': round((total - current['connect'] - current['db']) * 1000, 2),
+                    'statements': current['statements'],
+                    'rows': current['rows'],
+                    'body_bytes': len(response['body']) if response and response.get('body') else 0
+                }
+                # action и метод присылает клиент: неизвестные маршруты (405) и всё сверх лимита
+                # ключей идут в общий бакет, иначе случайные ?action= раздувают память инстанса
+                method = event.get('httpMethod')
+                key = 'OPTIONS' if method == 'OPTIONS' else f'{method} {action}'
+                if key not in _samples and (entry['status'] == 405 or len(_samples) >= MAX_SAMPLE_KEYS):
+                    key = 'unknown'
+                _samples.setdefault(key, deque(maxlen=METRICS_WINDOW)).append(entry)
+                if LOG_REQUESTS:
+                    print(json.dumps(entry))
+        return wrapper
+    return decorator
@@ -0,0 +1,145 @@
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import Optional
+
+USER_LIMIT = int(os.environ.get('LOGIN_USER_LIMIT', '5'))
+IP_LIMIT = int(os.environ.get('LOGIN_IP_LIMIT', '30'))
+WINDOW = float(os.environ.get('LOGIN_WINDOW', '300'))
+MAX_KEYS = int(os.environ.get('LOGIN_LIMIT_MAX_KEYS', '50000'))
+SHARED = os.environ.get('LOGIN_LIMIT_SHARED', '0') == '1'
+CLEANUP_PROBABILITY = 0.01
+
+
+class SlidingWindow:
+    """Скользящее окно на ключ: счётчики текущего и предыдущего окна, оценка с весом по доле прошедшего времени.
+    Память — три числа на ключ, самые давние ключи вытесняются при переполнении."""
+
+    def __init__(self, limit: int, window: float, max_keys: int = 50000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._entries = OrderedDict()
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _counts(self, entry, index: int):
+        if entry is None or entry[0] < index - 1:
+            return 0, 0
+        if entry[0] == index - 1:
+            return entry[1], 0
+        return entry[2], entry[1]
+
+    def estimate(self, key, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        index = int(now // self.window)
+        previous, current = self._counts(self._entries.get(key), index)
+        return previous * (1 - (now % self.window) / self.window) + current
+
+    def allowed(self, key, now: Optional[float] = None) -> bool:
+        return self.estimate(key, now) < self.limit
+
+    def retry_after(self, key, now: Optional[float] = None) -> int:
+        """Через сколько секунд оценка опустится ниже лимита при отсутствии новых попыток"""
+        now = time.time() if now is None else now
+        index = int(now // self.window)
+        previous, current = self._counts(self._entries.get(key), index)
+        window_end = (index + 1) * self.window
+        if current >= self.limit:
+            # в следующем окне текущий счётчик станет предыдущим и будет убывать уже оттуда
+            until = window_end + (1 - self.limit / current) * self.window
+            return max(1, int(until - now) + 1)
+        if not previous:
+            return 1
+        # previous * (window_end - t) / window + current < limit
+        until = window_end - (self.limit - current) * self.window / previous
+        return max(1, int(until - now) + 1)
+
+    def add(self, key, count: int = 1, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        previous, current = self._counts(self._entries.get(key), int(now // self.window))
+        self.seed(key, current + count, previous, now)
+
+    def seed(self, key, current: int, previous: int = 0, now: Optional[float] = None) -> None:
+        """Состояние ключа, которого экземпляр ещё не видел (например, из общей таблицы)"""
+        now = time.time() if now is None else now
+        self._entries[key] = [int(now // self.window), current, previous]
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+
+
+_users = SlidingWindow(USER_LIMIT, WINDOW, MAX_KEYS)
+_ips = SlidingWindow(IP_LIMIT, WINDOW, MAX_KEYS)
+
+
+def source_ip(event: dict) -> str:
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    if identity.get('sourceIp'):
+        return identity['sourceIp']
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    return (headers.get('x-forwarded-for') or '').split(',')[0].strip() or 'unknown'
+
+
+def keys(event: dict, username: str) -> tuple:
+    return 'user:' + username.strip().lower()[:200], 'ip:' + source_ip(event)[:64]
+
+
+def check(login_keys: tuple) -> int:
+    """0, если попытку можно выполнять, иначе Retry-After в секундах. В БД не ходит"""
+    user_key, ip_key = login_keys
+    now = time.time()
+    retry = 0
+    if not _users.allowed(user_key, now):
+        retry = _users.retry_after(user_key, now)
+    if not _ips.allowed(ip_key, now):
+        retry = max(retry, _ips.retry_after(ip_key, now))
+    return retry
+
+
+def load(cur, login_keys: tuple) -> int:
+    """Подтягивает из общей таблицы неудачи по ключам, которых экземпляр ещё не видел; возвращает Retry-After или 0"""
+    user_key, ip_key = login_keys
+    missing = [key for key, limiter in ((user_key, _users), (ip_key, _ips)) if key not in limiter]
+    if not SHARED or not missing:
+        return 0
+    index = int(time.time() // WINDOW)
+    cur.execute("""
+        SELECT key, window_index, attempts FROM login_attempts
+        WHERE key = ANY(%s) AND window_index >= %s
+    """, (missing, index - 1))
+    found = {}
+    for row in cur.fetchall():
+        found.setdefault(row['key'], {})[row['window_index']] = row['attempts']
+    for key in missing:
+        limiter = _users if key == user_key else _ips
+        counts = found.get(key, {})
+        limiter.seed(key, counts.get(index, 0), counts.get(index - 1, 0))
+    return check(login_keys)
+
+
+def attempt(login_keys: tuple) -> None:
+    """Учитывает попытку с адреса: по IP считаем все попытки, по имени — только неудачные"""
+    _ips.add(login_keys[1])
+
+
+def failed(cur, conn, login_keys: tuple) -> None:
+    """Неудачная попытка: +1 пользователю локально, а при общей таблице — обоим ключам и в БД"""
+    user_key, ip_key = login_keys
+    _users.add(user_key)
+    if not SHARED:
+        return
+    index = int(time.time() // WINDOW)
+    cur.execute("""
+        INSERT INTO login_attempts (key, window_index, attempts)
+        SELECT key, %s, 1 FROM unnest(%s::text[]) AS key
+        ON CONFLICT (key, window_index) DO UPDATE SET attempts = login_attempts.attempts + 1
+    """, (index, [user_key, ip_key]))
+    if random.random() < CLEANUP_PROBABILITY:
+        cur.execute("DELETE FROM login_attempts WHERE window_index < %s", (index - 1,))
+    conn.commit()
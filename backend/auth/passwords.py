@@ -0,0 +1,36 @@
+import base64
+import hashlib
+import hmac
+import os
+
+ALGORITHM = 'pbkdf2_sha256'
+ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', '120000'))
+SALT_BYTES = 16
+
+
+def hash_password(password: str, iterations: int = None) -> str:
+    """Хэш в формате pbkdf2_sha256$<итерации>$<соль>$<хэш> с уникальной солью"""
+    iterations = iterations or ITERATIONS
+    salt = os.urandom(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+    return '$'.join([
+        ALGORITHM,
+        str(iterations),
+        base64.b64encode(salt).decode(),
+        base64.b64encode(digest).decode()
+    ])
+
+
+def verify_password(password: str, stored: str) -> bool:
+    """Проверяет пароль; строки без префикса алгоритма считаются старым открытым паролем"""
+    if not stored.startswith(ALGORITHM + '$'):
+        return hmac.compare_digest(password.encode(), stored.encode())
+    _, iterations, salt, expected = stored.split('$')
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), base64.b64decode(salt), int(iterations))
+    return hmac.compare_digest(digest, base64.b64decode(expected))
+
+
+def needs_rehash(stored: str) -> bool:
+    """Открытый пароль или хэш с устаревшей стоимостью надо перехэшировать при входе"""
+    parts = stored.split('$')
+    return len(parts) != 4 or parts[0] != ALGORITHM or int(parts[1]) != ITERATIONS
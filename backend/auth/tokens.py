@@ -0,0 +1,72 @@
+import base64
+import hashlib
+import hmac
+import os
+import time
+from typing import Optional
+
+SECRET = os.environ.get('SESSION_SECRET', '').encode()
+SESSION_TTL = int(os.environ.get('SESSION_TTL', '86400'))
+BLOCK_CACHE_TTL = float(os.environ.get('BLOCK_CACHE_TTL', '60'))
+BLOCK_CACHE_SIZE = 10000
+
+_blocked = {}
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def _sign(payload: str) -> str:
+    if not SECRET:
+        raise RuntimeError('SESSION_SECRET is not configured')
+    return _b64(hmac.new(SECRET, payload.encode(), hashlib.sha256).digest())
+
+
+def issue(user_id: int, is_admin: bool) -> str:
+    """Токен вида <uid>.<admin>.<expires>.<hmac>, проверяется без обращения к БД"""
+    payload = f'{user_id}.{int(bool(is_admin))}.{int(time.time()) + SESSION_TTL}'
+    return f'{payload}.{_sign(payload)}'
+
+
+def verify(token: str) -> Optional[dict]:
+    try:
+        user_id, is_admin, expires, signature = token.split('.')
+        payload = f'{user_id}.{is_admin}.{expires}'
+        if not hmac.compare_digest(signature, _sign(payload)) or int(expires) < time.time():
+            return None
+        return {'user_id': int(user_id), 'is_admin': is_admin == '1', 'expires': int(expires)}
+    except (ValueError, AttributeError, TypeError):
+        return None
+
+
+def forget(user_id: int) -> None:
+    _blocked.pop(int(user_id), None)
+
+
+def _is_blocked(get_cursor, user_id: int) -> bool:
+    """is_blocked из локального кэша; в БД ходим не чаще раза в BLOCK_CACHE_TTL на пользователя.
+    get_cursor() вызывается только при промахе, так что попадания не берут соединение из пула"""
+    now = time.monotonic()
+    cached = _blocked.get(user_id)
+    if cached and cached[1] > now:
+        return cached[0]
+    cur = get_cursor()
+    cur.execute("SELECT is_blocked FROM users WHERE id = %s", (user_id,))
+    row = cur.fetchone()
+    blocked = row is None or bool(row['is_blocked'])
+    if len(_blocked) >= BLOCK_CACHE_SIZE:
+        _blocked.clear()
+    _blocked[user_id] = (blocked, now + BLOCK_CACHE_TTL)
+    return blocked
+
+
+def session(event: dict, get_cursor) -> Optional[dict]:
+    """Сессия из заголовка X-Auth-Token или None, если токена нет, он невалиден или пользователь заблокирован.
+    get_cursor — функция без аргументов, возвращающая курсор; без токена и при попадании в кэш не вызывается"""
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    token = headers.get('x-auth-token')
+    claims = verify(token) if token else None
+    if not claims or _is_blocked(get_cursor, claims['user_id']):
+        return None
+    return claims
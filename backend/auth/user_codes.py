@@ -0,0 +1,24 @@
+import secrets
+
+CODE_LENGTH = 20
+_BODY_RANGE = 10 ** (CODE_LENGTH - 1)
+_DOUBLED = [0, 2, 4, 6, 8, 1, 3, 5, 7, 9]
+
+
+def check_digit(body: str) -> str:
+    """Контрольная цифра Луна: ловит опечатку в одной цифре и перестановку соседних"""
+    total = 0
+    for position, char in enumerate(reversed(body)):
+        digit = ord(char) - 48
+        total += _DOUBLED[digit] if position % 2 == 0 else digit
+    return str((10 - total % 10) % 10)
+
+
+def generate() -> str:
+    """20-значный код: 19 случайных цифр из CSPRNG и контрольная цифра"""
+    body = str(secrets.randbelow(_BODY_RANGE)).zfill(CODE_LENGTH - 1)
+    return body + check_digit(body)
+
+
+def is_valid(code: str) -> bool:
+    return len(code) == CODE_LENGTH and code.isdigit() and check_digit(code[:-1]) == code[-1]
@@ -0,0 +1,136 @@
+import json
+import db
+import encoder
+import instrumentation
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+
+
+def respond(status: int, body: str = '', headers: dict = None) -> dict:
+    """Ответ функции; body — уже готовая строка (json.dumps, encoder.obj, CSV)"""
+    return {
+        'statusCode': status,
+        'headers': {**JSON_HEADERS, **headers} if headers else JSON_HEADERS,
+        'body': body,
+        'isBase64Encoded': False
+    }
+
+
+def ok(**fields) -> dict:
+    return respond(200, json.dumps(fields, default=encoder.default))
+
+
+def error(status: int, message: str, headers: dict = None) -> dict:
+    return respond(status, json.dumps({'error': message}), headers)
+
+
+METHOD_NOT_ALLOWED = error(405, 'Method not allowed')
+
+
+class Request:
+    """Запрос внутри маршрута. Соединение с БД берётся из пула при первом обращении к conn/cur,
+    так что ответы из кэша и отказы до SQL пул не трогают"""
+
+    __slots__ = ('event', 'method', 'action', 'params', 'body', 'session', '_headers', '_conn', '_cur')
+
+    def __init__(self, event: dict, method: str, action, params: dict, body: dict):
+        self.event = event
+        self.method = method
+        self.action = action
+        self.params = params
+        self.body = body
+        self.session = None
+        self._headers = None
+        self._conn = None
+        self._cur = None
+
+    @property
+    def headers(self) -> dict:
+        if self._headers is None:
+            self._headers = {k.lower(): v for k, v in (self.event.get('headers') or {}).items()}
+        return self._headers
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = db.acquire()
+        return self._conn
+
+    @property
+    def cur(self):
+        if self._cur is None:
+            self._cur = self.conn.cursor(cursor_factory=instrumentation.Cursor)
+        return self._cur
+
+    def close(self) -> None:
+        if self._cur is not None:
+            self._cur.close()
+        if self._conn is not None:
+            db.release(self._conn)
+
+
+class Router:
+    """Таблица маршрутов (метод, action) -> функция(Request) -> ответ.
+    session — функция (event, get_cursor) -> сессия или None, нужна, если есть маршруты с access"""
+
+    def __init__(self, methods: str, allow_headers: str, default_action: str = None, session=None):
+        self.default_action = default_action
+        self.session = session
+        self.routes = {}
+        self.preflight = {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': methods,
+                'Access-Control-Allow-Headers': allow_headers
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    def route(self, method: str, action: str, access: str = None):
+        """access: None — публично, 'user' — любой вошедший, 'admin' — только администратор"""
+        def decorator(fn):
+            self.routes[(method, action)] = (fn, access)
+            return fn
+        return decorator
+
+    def _authorize(self, request: Request, access: str):
+        request.session = self.session(request.event, lambda: request.cur)
+        if not request.session:
+            return error(401, 'Требуется авторизация')
+        if access == 'admin' and not request.session['is_admin']:
+            return error(403, 'Недостаточно прав')
+        return None
+
+    def dispatch(self, event: dict) -> dict:
+        method = event.get('httpMethod', 'GET')
+        if method == 'OPTIONS':
+            return self.preflight
+
+        request = None
+        try:
+            params = event.get('queryStringParameters') or {}
+            if method == 'GET':
+                body = {}
+                action = params.get('action', self.default_action)
+            else:
+                body = json.loads(event.get('body') or '{}')
+                action = body.get('action')
+
+            entry = self.routes.get((method, action))
+            if entry is None:
+                return METHOD_NOT_ALLOWED
+            fn, access = entry
+
+            request = Request(event, method, action, params, body)
+            if access:
+                denied = self._authorize(request, access)
+                if denied:
+                    return denied
+            return fn(request)
+        except Exception as e:
+            return error(500, str(e))
+        finally:
+            if request is not None:
+                request.close()
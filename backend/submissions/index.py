@@ -1,80 +1,118 @@
 import json
-import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from datetime import datetime
+import instrumentation
+import encoder
+import compression
+import core
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+router = core.Router('GET, POST, OPTIONS', 'Content-Type', default_action='list')
+
+
+def _filters(params: dict):
+    conditions = []
+    args = []
+    if params.get('task_id'):
+        conditions.append('ts.task_id = %s')
+        args.append(int(params['task_id']))
+    if params.get('user_id'):
+        conditions.append('ts.user_id = %s')
+        args.append(int(params['user_id']))
+    return conditions, args
+
+
+@router.route('GET', 'counts')
+def counts(request: core.Request) -> dict:
+    params = request.params
+    try:
+        conditions, args = _filters(params)
+    except ValueError:
+        return core.error(400, 'Некорректные параметры фильтра')
+
+    cur = request.cur
+    if params.get('user_id'):
+        # по пользователю заявок немного — считаем по индексу (user_id, status, submitted_at)
+        cur.execute(f"""
+            SELECT ts.status, COUNT(*) AS count
+            FROM task_submissions ts
+            WHERE {' AND '.join(conditions)}
+            GROUP BY ts.status
+        """, args)
+        result = {'pending': 0, 'approved': 0, 'rejected': 0}
+        result.update({row['status']: row['count'] for row in cur.fetchall()})
+    else:
+        # без фильтра и по заданию — счётчики task_stats (V0013), без скана заявок
+        task_filter = 'WHERE task_id = %s' if params.get('task_id') else ''
+        cur.execute(f"""
+            SELECT COALESCE(SUM(pending), 0) AS pending,
+                   COALESCE(SUM(approved), 0) AS approved,
+                   COALESCE(SUM(rejected), 0) AS rejected
+            FROM task_stats
+            {task_filter}
+        """, args)
+        result = {status: int(count) for status, count in cur.fetchone().items()}
+
+    return core.respond(200, json.dumps({'counts': result}))
+
+
+@router.route('GET', 'list')
+def list_submissions(request: core.Request) -> dict:
+    params = request.params
+    status = params.get('status', 'pending')
+    try:
+        conditions, args = _filters(params)
+        limit = min(max(int(params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        if params.get('cursor'):
+            cursor_submitted_at, cursor_id = params['cursor'].rsplit(':', 1)
+            cursor = (datetime.fromisoformat(cursor_submitted_at), int(cursor_id))
+        else:
+            cursor = None
+    except ValueError:
+        return core.error(400, 'Некорректные параметры списка')
+
+    conditions.insert(0, 'ts.status = %s')
+    args.insert(0, status)
+    if cursor:
+        conditions.append('(ts.submitted_at, ts.id) < (%s, %s)')
+        args.extend(cursor)
+
+    with request.conn.cursor(cursor_factory=instrumentation.TupleCursor) as rows_cur:
+        rows_cur.execute(f"""
+            SELECT
+                ts.id,
+                ts.task_id,
+                ts.user_id,
+                ts.screenshot_url,
+                ts.link_url,
+                ts.status,
+                ts.admin_comment,
+                ts.submitted_at,
+                ts.reviewed_at,
+                t.title as task_title,
+                t.reward,
+                u.username
+            FROM task_submissions ts
+            JOIN tasks t ON ts.task_id = t.id
+            JOIN users u ON ts.user_id = u.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY ts.submitted_at DESC, ts.id DESC
+            LIMIT %s
+        """, (*args, limit + 1))
+        submissions = rows_cur.fetchall()
+        description = rows_cur.description
+
+    next_cursor = None
+    if len(submissions) > limit:
+        submissions = submissions[:limit]
+        next_cursor = f"{submissions[-1][7].isoformat()}:{submissions[-1][0]}"
+
+    return core.respond(200, encoder.obj(submissions=encoder.rows(description, submissions), next_cursor=next_cursor))
+
+
+@instrumentation.instrumented('submissions')
+@compression.compressed
 def handler(event: dict, context) -> dict:
     """API для работы с выполненными заданиями пользователей"""
-    
-    method = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    try:
-        dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        if method == 'GET':
-            params = event.get('queryStringParameters') or {}
-            status = params.get('status', 'pending')
-            
-            cur.execute("""
-                SELECT 
-                    ts.id,
-                    ts.task_id,
-                    ts.user_id,
-                    ts.screenshot_url,
-                    ts.link_url,
-                    ts.status,
-                    ts.admin_comment,
-                    ts.submitted_at,
-                    ts.reviewed_at,
-                    t.title as task_title,
-                    t.reward,
-                    u.username
-                FROM task_submissions ts
-                JOIN tasks t ON ts.task_id = t.id
-                JOIN users u ON ts.user_id = u.id
-                WHERE ts.status = %s
-                ORDER BY ts.submitted_at DESC
-            """, (status,))
-            
-            submissions = cur.fetchall()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'submissions': [dict(s) for s in submissions]}, default=str),
-                'isBase64Encoded': False
-            }
-        
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
-    
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
+    return router.dispatch(event)
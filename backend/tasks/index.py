@@ -1,226 +1,352 @@
-import json
+import hashlib
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import time
+import instrumentation
+import encoder
+import compression
+import core
+from rate_limit import TokenBucket
+import outbox
+import tokens
 
+MAX_BULK_REVIEW = 500
+CATALOGUE_TTL = float(os.environ.get('CATALOGUE_TTL', '30'))
+SUBMIT_BURST = float(os.environ.get('SUBMIT_BURST', '5'))
+SUBMIT_WINDOW = float(os.environ.get('SUBMIT_WINDOW', '600'))
+OUTBOX_TIME_BUDGET = float(os.environ.get('OUTBOX_TIME_BUDGET', '20'))
+REVIEW_BUCKETS_PER_OCTAVE = 4
+CATALOGUE_HEADERS = {**core.JSON_HEADERS, 'Access-Control-Expose-Headers': 'ETag', 'Cache-Control': 'no-cache'}
+
+_catalogue = {'body': None, 'etag': None, 'expires': 0.0}
+_submit_limiter = TokenBucket(SUBMIT_BURST, SUBMIT_BURST / SUBMIT_WINDOW)
+
+router = core.Router(
+    'GET, POST, PUT, OPTIONS', 'Content-Type, If-None-Match, X-Auth-Token',
+    default_action='list', session=tokens.session
+)
+
+
+def _invalidate_catalogue() -> None:
+    _catalogue['expires'] = 0.0
+
+
+def _catalogue_response(headers: dict) -> dict:
+    """Отдаёт закэшированный каталог или 304, если у клиента актуальная версия"""
+    response_headers = {**CATALOGUE_HEADERS, 'ETag': _catalogue['etag']}
+    if_none_match = headers.get('if-none-match', '')
+    if _catalogue['etag'] in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]:
+        return {'statusCode': 304, 'headers': response_headers, 'body': '', 'isBase64Encoded': False}
+
+    return compression.reusable(
+        {'statusCode': 200, 'headers': response_headers, 'body': _catalogue['body'], 'isBase64Encoded': False},
+        _catalogue['etag']
+    )
+
+
+@router.route('GET', 'list')
+def list_tasks(request: core.Request) -> dict:
+    if time.monotonic() < _catalogue['expires']:
+        return _catalogue_response(request.headers)
+
+    conn = request.conn
+    with conn.cursor(cursor_factory=instrumentation.TupleCursor) as rows_cur:
+        rows_cur.execute("""
+            SELECT id, title, description, reward, difficulty, is_published, created_at
+            FROM tasks
+            WHERE is_published = TRUE
+            ORDER BY created_at DESC
+        """)
+        catalogue_body = encoder.obj(tasks=encoder.rows(rows_cur.description, rows_cur.fetchall()))
+    _catalogue.update(
+        body=catalogue_body,
+        etag='"' + hashlib.sha1(catalogue_body.encode()).hexdigest() + '"',
+        expires=time.monotonic() + CATALOGUE_TTL
+    )
+
+    return _catalogue_response(request.headers)
+
+
+def _median_review_seconds(buckets: list):
+    """Медиана времени проверки по гистограмме task_review_buckets (V0013): корзина b покрывает
+    [2^(b/4), 2^((b+1)/4)) секунд, внутри корзины — геометрическая интерполяция"""
+    half = sum(count for _, count in buckets) / 2
+    seen = 0
+    for bucket, count in buckets:
+        if seen + count >= half:
+            return round(2 ** ((bucket + (half - seen) / count) / REVIEW_BUCKETS_PER_OCTAVE))
+        seen += count
+    return None
+
+
+def _task_stats(cur) -> list:
+    """Счётчики всех заданий из task_stats: чтение по строке на задание, без агрегатов по заявкам"""
+    cur.execute("""
+        SELECT t.id AS task_id, t.title,
+               COALESCE(s.pending, 0) AS pending,
+               COALESCE(s.approved, 0) AS approved,
+               COALESCE(s.rejected, 0) AS rejected,
+               COALESCE(s.total_paid, 0) AS total_paid,
+               s.updated_at
+        FROM tasks t
+        LEFT JOIN task_stats s ON s.task_id = t.id
+        ORDER BY t.created_at DESC
+    """)
+    stats = [dict(row) for row in cur.fetchall()]
+    cur.execute("""
+        SELECT task_id, bucket, submissions
+        FROM task_review_buckets
+        WHERE submissions > 0
+        ORDER BY task_id, bucket
+    """)
+    buckets = {}
+    for row in cur.fetchall():
+        buckets.setdefault(row['task_id'], []).append((row['bucket'], row['submissions']))
+    for task in stats:
+        task['median_review_seconds'] = _median_review_seconds(buckets.get(task['task_id'], []))
+    return stats
+
+
+@router.route('GET', 'admin_list', access='admin')
+def admin_list(request: core.Request) -> dict:
+    conn = request.conn
+    with conn.cursor(cursor_factory=instrumentation.TupleCursor) as rows_cur:
+        rows_cur.execute("""
+            SELECT id, title, description, reward, difficulty, is_published, created_at
+            FROM tasks
+            ORDER BY created_at DESC
+        """)
+        tasks = encoder.rows(rows_cur.description, rows_cur.fetchall())
+
+    return core.respond(200, encoder.obj(tasks=tasks, stats=_task_stats(request.cur)))
+
+
+@router.route('GET', 'stats', access='admin')
+def stats(request: core.Request) -> dict:
+    return core.ok(stats=_task_stats(request.cur))
+
+
+@router.route('POST', 'create', access='admin')
+def create(request: core.Request) -> dict:
+    body, conn, cur = request.body, request.conn, request.cur
+    title = body.get('title')
+    description = body.get('description')
+    reward = body.get('reward')
+    difficulty = body.get('difficulty', 'medium')
+    created_by = request.session['user_id']
+
+    cur.execute("""
+        INSERT INTO tasks (title, description, reward, difficulty, created_by, is_published)
+        VALUES (%s, %s, %s, %s, %s, FALSE)
+        RETURNING id, title, description, reward, difficulty, is_published, created_at
+    """, (title, description, reward, difficulty, created_by))
+
+    task = cur.fetchone()
+    conn.commit()
+    _invalidate_catalogue()
+
+    return core.ok(task=dict(task))
+
+
+@router.route('POST', 'submit', access='user')
+def submit(request: core.Request) -> dict:
+    body, conn, cur = request.body, request.conn, request.cur
+    task_id = body.get('task_id')
+    user_id = request.session['user_id']
+    screenshot_url = body.get('screenshot_url')
+    link_url = body.get('link_url')
+
+    if user_id not in _submit_limiter:
+        cur.execute("""
+            SELECT COUNT(*) AS recent
+            FROM task_submissions
+            WHERE user_id = %s AND submitted_at > CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+        """, (user_id, SUBMIT_WINDOW))
+        _submit_limiter.seed(user_id, cur.fetchone()['recent'])
+
+    if not _submit_limiter.take(user_id):
+        return core.error(429, 'Слишком много заявок, попробуйте позже', {'Retry-After': str(_submit_limiter.retry_after(user_id))})
+
+    cur.execute("""
+        INSERT INTO task_submissions (task_id, user_id, screenshot_url, link_url, status)
+        VALUES (%s, %s, %s, %s, 'pending')
+        ON CONFLICT (task_id, user_id) WHERE status IN ('pending', 'approved') DO NOTHING
+        RETURNING id, task_id, user_id, screenshot_url, link_url, status, submitted_at
+    """, (task_id, user_id, screenshot_url, link_url))
+
+    submission = cur.fetchone()
+    duplicate = submission is None
+    if duplicate:
+        cur.execute("""
+            SELECT id, task_id, user_id, screenshot_url, link_url, status, submitted_at
+            FROM task_submissions
+            WHERE task_id = %s AND user_id = %s AND status IN ('pending', 'approved')
+        """, (task_id, user_id))
+        submission = cur.fetchone()
+    conn.commit()
+
+    return core.ok(submission=dict(submission), duplicate=duplicate)
+
+
+@router.route('PUT', 'publish', access='admin')
+def publish(request: core.Request) -> dict:
+    body, conn, cur = request.body, request.conn, request.cur
+    task_id = body.get('task_id')
+
+    cur.execute("""
+        UPDATE tasks
+        SET is_published = TRUE, updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s
+        RETURNING id, title, is_published
+    """, (task_id,))
+
+    task = cur.fetchone()
+    conn.commit()
+    _invalidate_catalogue()
+
+    return core.ok(task=dict(task))
+
+
+@router.route('PUT', 'approve', access='admin')
+def approve(request: core.Request) -> dict:
+    body, conn, cur = request.body, request.conn, request.cur
+    submission_id = body.get('submission_id')
+    admin_id = request.session['user_id']
+
+    outbox_event = outbox.enqueue_approval(cur, submission_id, admin_id)
+
+    if not outbox_event:
+        return core.error(404, 'Submission not found')
+
+    conn.commit()
+    outbox.kick()
+
+    return core.ok(success=True, queued=True, submission_id=outbox_event['submission_id'], outbox_id=outbox_event['id'])
+
+
+@router.route('PUT', 'process_outbox', access='admin')
+def process_outbox(request: core.Request) -> dict:
+    processed = outbox.drain(time_budget=OUTBOX_TIME_BUDGET)
+
+    return core.ok(success=True, processed=processed, backlog=outbox.backlog(request.cur))
+
+
+@router.route('PUT', 'reject', access='admin')
+def reject(request: core.Request) -> dict:
+    body, conn, cur = request.body, request.conn, request.cur
+    submission_id = body.get('submission_id')
+    admin_id = request.session['user_id']
+    comment = body.get('comment', '')
+
+    cur.execute("""
+        UPDATE task_submissions
+        SET status = 'rejected', reviewed_at = CURRENT_TIMESTAMP,
+            reviewed_by = %s, admin_comment = %s
+        WHERE id = %s AND status = 'pending'
+        RETURNING id
+    """, (admin_id, comment, submission_id))
+
+    # уже одобренную заявку отклонять нельзя: её начисление может ждать в outbox
+    if not cur.fetchone():
+        return core.error(404, 'Submission not found')
+
+    conn.commit()
+
+    return core.ok(success=True)
+
+
+@router.route('PUT', 'bulk_review', access='admin')
+def bulk_review(request: core.Request) -> dict:
+    body, conn, cur = request.body, request.conn, request.cur
+    submission_ids = sorted({int(i) for i in body.get('submission_ids', [])})
+    decision = body.get('decision')
+    admin_id = request.session['user_id']
+    comment = body.get('comment', '')
+
+    if decision not in ('approve', 'reject') or not submission_ids or len(submission_ids) > MAX_BULK_REVIEW:
+        return core.error(400, f'Нужны decision (approve/reject) и от 1 до {MAX_BULK_REVIEW} submission_ids')
+
+    if decision == 'reject':
+        cur.execute("""
+            WITH locked AS (
+                SELECT id FROM task_submissions
+                WHERE id = ANY(%s) AND status = 'pending'
+                ORDER BY id
+                FOR UPDATE
+            )
+            UPDATE task_submissions ts
+            SET status = 'rejected', reviewed_at = CURRENT_TIMESTAMP,
+                reviewed_by = %s, admin_comment = %s
+            FROM locked
+            WHERE ts.id = locked.id
+            RETURNING ts.id
+        """, (submission_ids, admin_id, comment))
+        reviewed = {row['id'] for row in cur.fetchall()}
+        credited = []
+    else:
+        # общий порядок блокировок с outbox: сначала пользователи по id, потом заявки
+        # и task_stats (через триггер V0013) — иначе встречные начисления ловят deadlock
+        cur.execute("""
+            SELECT id FROM users
+            WHERE id IN (SELECT user_id FROM task_submissions WHERE id = ANY(%s) AND status = 'pending')
+            ORDER BY id
+            FOR NO KEY UPDATE
+        """, (submission_ids,))
+        cur.execute("""
+            WITH locked AS (
+                SELECT id FROM task_submissions
+                WHERE id = ANY(%s) AND status = 'pending'
+                ORDER BY id
+                FOR UPDATE
+            )
+            UPDATE task_submissions ts
+            SET status = 'approved', reviewed_at = CURRENT_TIMESTAMP, reviewed_by = %s
+            FROM locked, tasks t
+            WHERE ts.id = locked.id AND t.id = ts.task_id
+            RETURNING ts.id, ts.user_id, t.reward
+        """, (submission_ids, admin_id))
+        approved = cur.fetchall()
+        reviewed = {row['id'] for row in approved}
+        credited = []
+
+        if approved:
+            ids = [row['id'] for row in approved]
+            user_ids = [row['user_id'] for row in approved]
+            rewards = [row['reward'] for row in approved]
+
+            cur.execute("""
+                UPDATE users u
+                SET balance = u.balance + agg.total,
+                    completed_tasks = u.completed_tasks + agg.approved,
+                    level = FLOOR((u.completed_tasks + agg.approved) / 5) + 1
+                FROM (
+                    SELECT user_id, SUM(reward) AS total, COUNT(*) AS approved
+                    FROM unnest(%s::int[], %s::numeric[]) AS r(user_id, reward)
+                    GROUP BY user_id
+                ) agg
+                WHERE u.id = agg.user_id
+                RETURNING u.id, u.balance, u.level, u.completed_tasks
+            """, (user_ids, rewards))
+            credited = [dict(row) for row in cur.fetchall()]
+
+            cur.execute("""
+                INSERT INTO transactions (user_id, type, amount, task_submission_id, description)
+                SELECT user_id, 'task', reward, submission_id, 'Награда за выполнение задания'
+                FROM unnest(%s::int[], %s::numeric[], %s::int[]) AS r(user_id, reward, submission_id)
+            """, (user_ids, rewards, ids))
+
+    conn.commit()
+
+    status = 'approved' if decision == 'approve' else 'rejected'
+    results = [
+        {'submission_id': i, 'status': status if i in reviewed else 'not_pending'}
+        for i in submission_ids
+    ]
+
+    return core.ok(success=True, results=results, users=credited)
+
+
+@instrumentation.instrumented('tasks')
+@compression.compressed
 def handler(event: dict, context) -> dict:
     """API для управления заданиями и их модерации"""
-    
-    method = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    try:
-        dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        if method == 'GET':
-            params = event.get('queryStringParameters') or {}
-            action = params.get('action', 'list')
-            
-            if action == 'list':
-                cur.execute("""
-                    SELECT id, title, description, reward, difficulty, is_published, created_at
-                    FROM tasks
-                    WHERE is_published = TRUE
-                    ORDER BY created_at DESC
-                """)
-                tasks = cur.fetchall()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'tasks': [dict(t) for t in tasks]}, default=str),
-                    'isBase64Encoded': False
-                }
-            
-            elif action == 'admin_list':
-                cur.execute("""
-                    SELECT id, title, description, reward, difficulty, is_published, created_at
-                    FROM tasks
-                    ORDER BY created_at DESC
-                """)
-                tasks = cur.fetchall()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'tasks': [dict(t) for t in tasks]}, default=str),
-                    'isBase64Encoded': False
-                }
-        
-        elif method == 'POST':
-            body = json.loads(event.get('body', '{}'))
-            action = body.get('action')
-            
-            if action == 'create':
-                title = body.get('title')
-                description = body.get('description')
-                reward = body.get('reward')
-                difficulty = body.get('difficulty', 'medium')
-                created_by = body.get('created_by')
-                
-                cur.execute("""
-                    INSERT INTO tasks (title, description, reward, difficulty, created_by, is_published)
-                    VALUES (%s, %s, %s, %s, %s, FALSE)
-                    RETURNING id, title, description, reward, difficulty, is_published, created_at
-                """, (title, description, reward, difficulty, created_by))
-                
-                task = cur.fetchone()
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'task': dict(task)}, default=str),
-                    'isBase64Encoded': False
-                }
-            
-            elif action == 'submit':
-                task_id = body.get('task_id')
-                user_id = body.get('user_id')
-                screenshot_url = body.get('screenshot_url')
-                link_url = body.get('link_url')
-                
-                cur.execute("""
-                    INSERT INTO task_submissions (task_id, user_id, screenshot_url, link_url, status)
-                    VALUES (%s, %s, %s, %s, 'pending')
-                    RETURNING id, task_id, user_id, screenshot_url, link_url, status, submitted_at
-                """, (task_id, user_id, screenshot_url, link_url))
-                
-                submission = cur.fetchone()
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'submission': dict(submission)}, default=str),
-                    'isBase64Encoded': False
-                }
-        
-        elif method == 'PUT':
-            body = json.loads(event.get('body', '{}'))
-            action = body.get('action')
-            
-            if action == 'publish':
-                task_id = body.get('task_id')
-                
-                cur.execute("""
-                    UPDATE tasks
-                    SET is_published = TRUE, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                    RETURNING id, title, is_published
-                """, (task_id,))
-                
-                task = cur.fetchone()
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'task': dict(task)}, default=str),
-                    'isBase64Encoded': False
-                }
-            
-            elif action == 'approve':
-                submission_id = body.get('submission_id')
-                admin_id = body.get('admin_id')
-                
-                cur.execute("""
-                    SELECT ts.id, ts.task_id, ts.user_id, t.reward
-                    FROM task_submissions ts
-                    JOIN tasks t ON ts.task_id = t.id
-                    WHERE ts.id = %s AND ts.status = 'pending'
-                """, (submission_id,))
-                
-                submission = cur.fetchone()
-                
-                if not submission:
-                    return {
-                        'statusCode': 404,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Submission not found'}),
-                        'isBase64Encoded': False
-                    }
-                
-                cur.execute("""
-                    UPDATE task_submissions
-                    SET status = 'approved', reviewed_at = CURRENT_TIMESTAMP, reviewed_by = %s
-                    WHERE id = %s
-                """, (admin_id, submission_id))
-                
-                cur.execute("""
-                    UPDATE users
-                    SET balance = balance + %s, completed_tasks = completed_tasks + 1,
-                        level = FLOOR((completed_tasks + 1) / 5) + 1
-                    WHERE id = %s
-                    RETURNING balance, level, completed_tasks
-                """, (submission['reward'], submission['user_id']))
-                
-                user = cur.fetchone()
-                
-                cur.execute("""
-                    INSERT INTO transactions (user_id, type, amount, task_submission_id, description)
-                    VALUES (%s, 'task', %s, %s, 'Награда за выполнение задания')
-                """, (submission['user_id'], submission['reward'], submission_id))
-                
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True, 'user': dict(user)}, default=str),
-                    'isBase64Encoded': False
-                }
-            
-            elif action == 'reject':
-                submission_id = body.get('submission_id')
-                admin_id = body.get('admin_id')
-                comment = body.get('comment', '')
-                
-                cur.execute("""
-                    UPDATE task_submissions
-                    SET status = 'rejected', reviewed_at = CURRENT_TIMESTAMP, 
-                        reviewed_by = %s, admin_comment = %s
-                    WHERE id = %s
-                """, (admin_id, comment, submission_id))
-                
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True}),
-                    'isBase64Encoded': False
-                }
-        
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
-    
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
+    return router.dispatch(event)
@@ -0,0 +1,195 @@
+import json
+import os
+import threading
+import time
+import db
+import instrumentation
+
+BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '200'))
+MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '8'))
+WORKERS = int(os.environ.get('OUTBOX_WORKERS', '2'))
+RETRY_BASE_SECONDS = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+stats = {'batches': 0, 'applied': 0, 'failed': 0}
+
+
+def enqueue_approval(cur, submission_id: int, admin_id: int):
+    """Одобряет заявку и кладёт событие в outbox одним оператором, в транзакции запроса.
+    Возвращает строку события или None, если заявка уже не pending.
+    Пользователь блокируется первым — в том же порядке, что и в _apply, до task_stats (V0013)"""
+    cur.execute("""
+        SELECT id FROM users
+        WHERE id = (SELECT user_id FROM task_submissions WHERE id = %s)
+        FOR NO KEY UPDATE
+    """, (submission_id,))
+    cur.execute("""
+        WITH approved AS (
+            UPDATE task_submissions ts
+            SET status = 'approved', reviewed_at = CURRENT_TIMESTAMP, reviewed_by = %s
+            FROM tasks t
+            WHERE ts.id = %s AND ts.status = 'pending' AND t.id = ts.task_id
+            RETURNING ts.id, ts.user_id, t.reward
+        )
+        INSERT INTO moderation_outbox (event_type, submission_id, user_id, amount)
+        SELECT 'submission_approved', id, user_id, reward FROM approved
+        RETURNING id, submission_id, user_id, amount
+    """, (admin_id, submission_id))
+    return cur.fetchone()
+
+
+def _apply(cur, events: list) -> None:
+    """Начисления по событиям одобрения: баланс, счётчик, уровень и запись в журнал, всё множествами"""
+    user_ids = [event['user_id'] for event in events]
+    amounts = [event['amount'] for event in events]
+    cur.execute("SELECT id FROM users WHERE id = ANY(%s) ORDER BY id FOR NO KEY UPDATE", (sorted(set(user_ids)),))
+    cur.execute("""
+        UPDATE users u
+        SET balance = u.balance + agg.total,
+            completed_tasks = u.completed_tasks + agg.approved,
+            level = FLOOR((u.completed_tasks + agg.approved) / 5) + 1
+        FROM (
+            SELECT user_id, SUM(amount) AS total, COUNT(*) AS approved
+            FROM unnest(%s::int[], %s::numeric[]) AS r(user_id, amount)
+            GROUP BY user_id
+        ) agg
+        WHERE u.id = agg.user_id
+    """, (user_ids, amounts))
+    cur.execute("""
+        INSERT INTO transactions (user_id, type, amount, task_submission_id, description)
+        SELECT user_id, 'task', amount, submission_id, 'Награда за выполнение задания'
+        FROM unnest(%s::int[], %s::numeric[], %s::int[]) AS r(user_id, amount, submission_id)
+    """, (user_ids, amounts, [event['submission_id'] for event in events]))
+    cur.execute("""
+        UPDATE moderation_outbox
+        SET processed_at = CURRENT_TIMESTAMP, attempts = attempts + 1, last_error = NULL
+        WHERE id = ANY(%s)
+    """, ([event['id'] for event in events],))
+
+
+def _claim(cur, limit: int, only_id: int = None) -> list:
+    """Забирает готовые события под блокировку; параллельные воркеры пропускают чужие (SKIP LOCKED)"""
+    cur.execute("""
+        SELECT id, submission_id, user_id, amount, attempts
+        FROM moderation_outbox
+        WHERE processed_at IS NULL AND event_type = 'submission_approved'
+          AND attempts < %s AND available_at <= CURRENT_TIMESTAMP
+          AND (%s::bigint IS NULL OR id = %s::bigint)
+        ORDER BY id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (MAX_ATTEMPTS, only_id, only_id, limit))
+    return cur.fetchall()
+
+
+def _fail(conn, event: dict, error: Exception) -> None:
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE moderation_outbox
+            SET attempts = attempts + 1, last_error = %s,
+                available_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+            WHERE id = %s AND processed_at IS NULL
+        """, (str(error)[:1000], RETRY_BASE_SECONDS ** (event['attempts'] + 1), event['id']))
+    conn.commit()
+    stats['failed'] += 1
+    print(json.dumps({'event': 'outbox_retry', 'outbox_id': event['id'], 'attempts': event['attempts'] + 1, 'error': str(error)[:200]}))
+
+
+def drain_batch(conn, batch_size: int = None) -> int:
+    """Один батч: событие применяется ровно один раз, потому что отметка processed_at
+    коммитится в той же транзакции, что и начисление. Если батч падает, события
+    проводятся по одному, и с ошибкой откладывается только сломанное. Возвращает число обработанных"""
+    with conn.cursor(cursor_factory=instrumentation.Cursor) as cur:
+        events = _claim(cur, batch_size or BATCH_SIZE)
+        if not events:
+            conn.rollback()
+            return 0
+        try:
+            _apply(cur, events)
+            conn.commit()
+            stats['batches'] += 1
+            stats['applied'] += len(events)
+            return len(events)
+        except Exception as e:
+            conn.rollback()
+            if len(events) == 1:
+                _fail(conn, events[0], e)
+                return 1
+    for event in events:
+        try:
+            with conn.cursor(cursor_factory=instrumentation.Cursor) as cur:
+                claimed = _claim(cur, 1, event['id'])
+                if claimed:
+                    _apply(cur, claimed)
+            conn.commit()
+            stats['applied'] += len(claimed)
+        except Exception as e:
+            conn.rollback()
+            _fail(conn, event, e)
+    stats['batches'] += 1
+    return len(events)
+
+
+def drain(time_budget: float = None, batch_size: int = None) -> int:
+    """Обрабатывает очередь до опустошения или до истечения time_budget секунд; годится и для тестов"""
+    deadline = time.monotonic() + time_budget if time_budget else None
+    conn = db.acquire()
+    processed = 0
+    broken = False
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            count = drain_batch(conn, batch_size)
+            processed += count
+            if count == 0:
+                break
+    except Exception:
+        broken = True
+        raise
+    finally:
+        db.release(conn, broken=broken)
+    return processed
+
+
+def _drain_quietly() -> None:
+    try:
+        drain()
+    except Exception as e:
+        print(json.dumps({'event': 'outbox_drain_failed', 'error': str(e)[:200]}))
+
+
+def kick() -> None:
+    """Запускает разбор очереди в фоне экземпляра, не задерживая ответ"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='outbox')
+    _executor.submit(_drain_quietly)
+
+
+def backlog(cur) -> dict:
+    cur.execute("""
+        SELECT COUNT(*) FILTER (WHERE attempts < %s) AS pending,
+               COUNT(*) FILTER (WHERE attempts >= %s) AS dead,
+               MIN(created_at) FILTER (WHERE attempts < %s) AS oldest
+        FROM moderation_outbox
+        WHERE processed_at IS NULL
+    """, (MAX_ATTEMPTS, MAX_ATTEMPTS, MAX_ATTEMPTS))
+    return dict(cur.fetchone())
+
+
+if __name__ == '__main__':
+    # Отдельный воркер: python outbox.py (DATABASE_URL из окружения), WORKERS потоков опрашивают очередь
+    interval = float(os.environ.get('OUTBOX_POLL_INTERVAL', '1'))
+
+    def loop() -> None:
+        while True:
+            if not drain():
+                time.sleep(interval)
+
+    threads = [threading.Thread(target=loop, daemon=True) for _ in range(WORKERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
@@ -0,0 +1,41 @@
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    """Токен-бакет на ключ в памяти экземпляра; самые старые ключи вытесняются при переполнении"""
+
+    def __init__(self, capacity: float, refill_per_second: float, max_keys: int = 10000):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def __contains__(self, key) -> bool:
+        return key in self._buckets
+
+    def seed(self, key, used: float) -> None:
+        """Начальное состояние для ключа, которого экземпляр ещё не видел (например, по данным из БД)"""
+        self._buckets[key] = [max(self.capacity - used, 0.0), time.monotonic()]
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+    def take(self, key) -> bool:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self.seed(key, 0)
+            bucket = self._buckets[key]
+        now = time.monotonic()
+        bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_per_second)
+        bucket[1] = now
+        self._buckets.move_to_end(key)
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def retry_after(self, key) -> int:
+        bucket = self._buckets.get(key)
+        missing = 1 - bucket[0] if bucket else 0
+        return max(1, int(missing / self.refill_per_second) + 1)
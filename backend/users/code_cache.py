@@ -0,0 +1,73 @@
+import os
+import time
+from collections import OrderedDict
+import instrumentation
+
+TTL = float(os.environ.get('CODE_CACHE_TTL', '60'))
+NEGATIVE_TTL = float(os.environ.get('CODE_CACHE_NEGATIVE_TTL', '10'))
+MAX_ENTRIES = int(os.environ.get('CODE_CACHE_SIZE', '50000'))
+
+_entries = OrderedDict()
+_codes_by_user = {}
+stats = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+
+def cache_stats() -> dict:
+    lookups = stats['hits'] + stats['negative_hits'] + stats['misses']
+    return dict(
+        stats,
+        size=len(_entries),
+        hit_rate=round((stats['hits'] + stats['negative_hits']) / lookups, 4) if lookups else None
+    )
+
+
+instrumentation.register_cache('user_codes', cache_stats)
+
+
+def _store(code: str, user, ttl: float) -> None:
+    _entries[code] = (user, time.monotonic() + ttl)
+    _entries.move_to_end(code)
+    if user is not None:
+        _codes_by_user[user['id']] = code
+    while len(_entries) > MAX_ENTRIES:
+        evicted, (evicted_user, _) = _entries.popitem(last=False)
+        if evicted_user is not None:
+            _codes_by_user.pop(evicted_user['id'], None)
+        stats['evictions'] += 1
+
+
+def lookup(codes: list, get_cursor) -> dict:
+    """code -> {'id', 'username', 'user_code', 'is_blocked'} или None для неизвестных кодов.
+    Коды неизменяемы, поэтому из БД одним запросом добираются только промахи кэша;
+    get_cursor() вызывается только тогда, так что попадания не берут соединение из пула"""
+    now = time.monotonic()
+    found, missing = {}, []
+    for code in dict.fromkeys(codes):
+        cached = _entries.get(code)
+        if cached and cached[1] > now:
+            _entries.move_to_end(code)
+            found[code] = cached[0]
+            stats['hits' if cached[0] is not None else 'negative_hits'] += 1
+        else:
+            missing.append(code)
+    if missing:
+        stats['misses'] += len(missing)
+        cur = get_cursor()
+        cur.execute("""
+            SELECT id, username, user_code, is_blocked
+            FROM users
+            WHERE user_code = ANY(%s)
+        """, (missing,))
+        loaded = {row['user_code']: dict(row) for row in cur.fetchall()}
+        for code in missing:
+            user = loaded.get(code)
+            _store(code, user, TTL if user is not None else NEGATIVE_TTL)
+            found[code] = user
+    return found
+
+
+def invalidate(user_id: int) -> None:
+    """Сбрасывает запись пользователя (block/unblock); следующий поиск по коду пойдёт в БД"""
+    code = _codes_by_user.pop(int(user_id), None)
+    if code is not None and _entries.pop(code, None) is not None:
+        stats['invalidations'] += 1
@@ -0,0 +1,88 @@
+import base64
+import functools
+import os
+import zlib
+from collections import OrderedDict
+
+MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+LEVEL = int(os.environ.get('COMPRESSION_LEVEL', '6'))
+CACHE_SIZE = 8
+
+_cache = OrderedDict()
+
+
+def choose_encoding(accept_encoding: str):
+    """gzip или deflate по Accept-Encoding с учётом q-значений; None, если сжимать нельзя"""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    wildcard = accepted.get('*', 0.0)
+    candidates = [(accepted.get(name, wildcard), name) for name in ('gzip', 'deflate')]
+    q, name = max(candidates, key=lambda c: c[0])
+    return name if q > 0 else None
+
+
+def compress(body: str, encoding: str, level: int = None) -> bytes:
+    level = LEVEL if level is None else level
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return compressor.compress(body.encode()) + compressor.flush()
+    return zlib.compress(body.encode(), level)
+
+
+def _compressed_body(body: str, encoding: str, reuse_key) -> str:
+    """Тела, помеченные обработчиком как повторно отдаваемые (каталог по ETag), сжимаются один раз;
+    разовые ответы (выгрузки, выписки) сжимаются без кэша, чтобы не держать их в памяти"""
+    if reuse_key is None:
+        return base64.b64encode(compress(body, encoding)).decode()
+    key = (encoding, reuse_key)
+    cached = _cache.get(key)
+    if cached is None:
+        cached = base64.b64encode(compress(body, encoding)).decode()
+        _cache[key] = cached
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    else:
+        _cache.move_to_end(key)
+    return cached
+
+
+def reusable(response: dict, key: str) -> dict:
+    """Помечает ответ как повторно отдаваемый: сжатое тело кэшируется по key (например, ETag).
+    key должен меняться вместе с телом"""
+    return dict(response, reuse_key=key)
+
+
+def compressed(handler):
+    """Сжимает JSON-ответы больше MIN_BYTES, если клиент прислал подходящий Accept-Encoding"""
+    @functools.wraps(handler)
+    def wrapper(event: dict, context) -> dict:
+        response = handler(event, context)
+        reuse_key = response.get('reuse_key')
+        if reuse_key is not None:
+            response = {k: v for k, v in response.items() if k != 'reuse_key'}
+        body = response.get('body')
+        if response.get('isBase64Encoded') or not isinstance(body, str):
+            return response
+        # ответ зависит от Accept-Encoding, даже если это тело отдаётся несжатым
+        headers = dict(response.get('headers') or {}, Vary='Accept-Encoding')
+        encoding = None
+        if len(body) >= MIN_BYTES:
+            event_headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+            encoding = choose_encoding(event_headers.get('accept-encoding', ''))
+        if not encoding:
+            return dict(response, headers=headers)
+        return dict(
+            response,
+            headers=dict(headers, **{'Content-Encoding': encoding}),
+            body=_compressed_body(body, encoding, reuse_key),
+            isBase64Encoded=True
+        )
+    return wrapper
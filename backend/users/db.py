@@ -0,0 +1,98 @@
+import json
+import os
+import threading
+import time
+import instrumentation
+
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '4'))
+IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', '30'))
+
+_idle = []
+_lock = threading.Lock()
+stats = {'hits': 0, 'misses': 0, 'discarded': 0}
+
+
+def _connect():
+    import psycopg2
+    return psycopg2.connect(os.environ.get('DATABASE_URL'))
+
+
+def _close(conn) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _is_alive(conn, idle_for: float) -> bool:
+    """Проверка соединения: закрытые отбрасываем, давно простаивающие пингуем"""
+    if conn.closed:
+        return False
+    if idle_for < PING_AFTER:
+        return True
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT 1')
+        cur.close()
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+
+def acquire():
+    """Берёт тёплое соединение из пула или открывает новое"""
+    started = time.perf_counter()
+    conn = _acquire()
+    instrumentation.record('connect', time.perf_counter() - started)
+    return conn
+
+
+def _acquire():
+    now = time.monotonic()
+    while True:
+        with _lock:
+            if not _idle:
+                break
+            conn, released_at = _idle.pop()
+        idle_for = now - released_at
+        if idle_for < IDLE_TIMEOUT and _is_alive(conn, idle_for):
+            stats['hits'] += 1
+            return conn
+        stats['discarded'] += 1
+        _close(conn)
+    stats['misses'] += 1
+    conn = _connect()
+    print(json.dumps({'event': 'db_pool_miss', **pool_stats()}))
+    return conn
+
+
+def release(conn, broken: bool = False) -> None:
+    """Возвращает соединение в пул, откатывая незавершённую транзакцию"""
+    from psycopg2 import InterfaceError, extensions
+    if broken or conn.closed:
+        stats['discarded'] += 1
+        _close(conn)
+        return
+    try:
+        status = conn.get_transaction_status()
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            raise InterfaceError('connection lost')
+        if status != extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except Exception:
+        stats['discarded'] += 1
+        _close(conn)
+        return
+    with _lock:
+        if len(_idle) < POOL_SIZE:
+            _idle.append((conn, time.monotonic()))
+            return
+    _close(conn)
+
+
+def pool_stats() -> dict:
+    with _lock:
+        idle = len(_idle)
+    return dict(stats, idle=idle, size=POOL_SIZE)
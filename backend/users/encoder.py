@@ -0,0 +1,98 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from json.encoder import encode_basestring_ascii
+
+BOOL, INT8, INT2, INT4, TEXT, FLOAT4, FLOAT8, VARCHAR, NUMERIC = 16, 20, 21, 23, 25, 700, 701, 1043, 1700
+DATE, TIMESTAMP, TIMESTAMPTZ = 1082, 1114, 1184
+
+_compiled = {}
+
+
+class Raw(str):
+    """Уже закодированный JSON, вставляется в тело ответа как есть"""
+
+
+def money(value: Decimal) -> str:
+    """Деньги везде отдаются строкой с двумя знаками: "1500.00" """
+    return format(value, '.2f')
+
+
+def default(value):
+    """default для json.dumps: деньги строкой с двумя знаками, время как 'YYYY-MM-DD HH:MM:SS'"""
+    if isinstance(value, Decimal):
+        return money(value)
+    if isinstance(value, datetime):
+        return value.isoformat(' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def _encode_money(value) -> str:
+    return '"' + format(value, '.2f') + '"'
+
+
+def _encode_timestamp(value) -> str:
+    return '"' + value.isoformat(' ') + '"'
+
+
+def _encode_date(value) -> str:
+    return '"' + value.isoformat() + '"'
+
+
+def _encode_bool(value) -> str:
+    return 'true' if value else 'false'
+
+
+def _encode_other(value) -> str:
+    return json.dumps(value, default=default)
+
+
+_BY_TYPE = {
+    BOOL: _encode_bool,
+    INT2: str,
+    INT4: str,
+    INT8: str,
+    TEXT: encode_basestring_ascii,
+    VARCHAR: encode_basestring_ascii,
+    FLOAT4: repr,
+    FLOAT8: repr,
+    NUMERIC: _encode_money,
+    DATE: _encode_date,
+    TIMESTAMP: _encode_timestamp,
+    TIMESTAMPTZ: _encode_timestamp
+}
+
+
+def _row_encoder(description):
+    """Собирает функцию кодирования строки под форму результата: ключи и типы считаются один раз"""
+    key = tuple((column.name, column.type_code) for column in description)
+    encode = _compiled.get(key)
+    if encode is None:
+        namespace = {f'_e{i}': _BY_TYPE.get(type_code, _encode_other) for i, (_, type_code) in enumerate(key)}
+        fields = ' + '.join(
+            f"{(',' if i else '{') + encode_basestring_ascii(name) + ':'!r} + ('null' if r[{i}] is None else _e{i}(r[{i}]))"
+            for i, (name, _) in enumerate(key)
+        )
+        exec(f"def encode(r):\n    return {fields} + '}}'", namespace)
+        encode = _compiled[key] = namespace['encode']
+    return encode
+
+
+def rows(description, records) -> Raw:
+    """JSON-массив объектов прямо из кортежей строк, без промежуточных dict и default-колбэков"""
+    return Raw('[' + ','.join(map(_row_encoder(description), records)) + ']')
+
+
+def lines(description, records) -> str:
+    """NDJSON: по объекту на строку, тем же кодировщиком строк"""
+    return '\n'.join(map(_row_encoder(description), records))
+
+
+def obj(**fields) -> str:
+    """Тело ответа: Raw-значения вставляются как есть, остальные кодируются json.dumps"""
+    return '{' + ','.join(
+        encode_basestring_ascii(name) + ':' + (value if isinstance(value, Raw) else json.dumps(value, default=default))
+        for name, value in fields.items()
+    ) + '}'
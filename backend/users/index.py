@@ -1,159 +1,664 @@
-import json
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import time
+from decimal import Decimal, InvalidOperation
+import instrumentation
+import encoder
+import compression
+import core
+import tokens
+import code_cache
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_LEADERBOARD_SIZE = 100
+RESET_BATCH_SIZE = 1000
+MAX_RESET_BATCH_SIZE = 10000
+EXPORT_CHUNK_ROWS = 50000
+MAX_EXPORT_CHUNK_ROWS = 200000
+EXPORT_FETCH_SIZE = 5000
+ME_SUBMISSIONS = 20
+ME_LEDGER_LIMIT = 100
+MAX_CODE_BATCH = 100
+MAX_TRANSFER_AMOUNT = Decimal('1e13')  # DECIMAL(15, 2)
+RESET_TIME_BUDGET = float(os.environ.get('RESET_TIME_BUDGET', '20'))
+RECONCILE_BATCH_SIZE = 1000
+MAX_RECONCILE_BATCH_SIZE = 10000
+RECONCILE_TIME_BUDGET = float(os.environ.get('RECONCILE_TIME_BUDGET', '20'))
+SNAPSHOT_LAG = float(os.environ.get('SNAPSHOT_LAG', '300'))
+MAX_DRIFT_REPORT = 100
+
+router = core.Router(
+    'GET, POST, PUT, OPTIONS', 'Content-Type, X-Auth-Token',
+    default_action='list', session=tokens.session
+)
+
+
+@router.route('GET', 'list', access='admin')
+def list_users(request: core.Request) -> dict:
+    params = request.params
+    conditions = ['is_admin = FALSE']
+    args = []
+
+    try:
+        limit = min(max(int(params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        if params.get('is_blocked') in ('true', 'false'):
+            conditions.append('is_blocked = %s')
+            args.append(params['is_blocked'] == 'true')
+        if params.get('level_min'):
+            conditions.append('level >= %s')
+            args.append(int(params['level_min']))
+        if params.get('level_max'):
+            conditions.append('level <= %s')
+            args.append(int(params['level_max']))
+        if params.get('username'):
+            prefix = params['username'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            conditions.append('username LIKE %s')
+            args.append(prefix + '%')
+        if params.get('cursor'):
+            cursor_balance, cursor_id = params['cursor'].split(':')
+            cursor_balance = Decimal(cursor_balance)
+            if not cursor_balance.is_finite():
+                raise ValueError(cursor_balance)
+            conditions.append('(balance, id) < (%s, %s)')
+            args.extend([cursor_balance, int(cursor_id)])
+    except (ValueError, InvalidOperation):
+        return core.error(400, 'Некорректные параметры списка')
+
+    conn = request.conn
+    with conn.cursor(cursor_factory=instrumentation.TupleCursor) as rows_cur:
+        rows_cur.execute(f"""
+            SELECT id, username, email, balance, user_code, level, completed_tasks, is_blocked
+            FROM users
+            WHERE {' AND '.join(conditions)}
+            ORDER BY balance DESC, id DESC
+            LIMIT %s
+        """, (*args, limit + 1))
+        users = rows_cur.fetchall()
+        description = rows_cur.description
+
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = f"{users[-1][3]}:{users[-1][0]}"
+
+    return core.respond(200, encoder.obj(users=encoder.rows(description, users), next_cursor=next_cursor))
+
+
+@router.route('GET', 'leaderboard')
+@router.route('GET', 'stats')
+def stats(request: core.Request) -> dict:
+    params, conn, cur = request.params, request.conn, request.cur
+    # агрегаты хранятся шардами (V0014): сумма по 16 строкам и уровням, без скана users
+    cur.execute("""
+        SELECT COALESCE(SUM(total_supply), 0) AS total_supply,
+               COALESCE(SUM(users_count), 0)::bigint AS users_count,
+               COALESCE(SUM(tasks_completed), 0)::bigint AS tasks_completed,
+               MAX(updated_at) AS updated_at
+        FROM platform_stats_shards
+    """)
+    stats = dict(cur.fetchone())
+    cur.execute("""
+        SELECT level, SUM(users_count)::bigint AS users_count
+        FROM level_stats_shards
+        GROUP BY level
+        HAVING SUM(users_count) > 0
+        ORDER BY level
+    """)
+    stats['levels'] = [dict(row) for row in cur.fetchall()]
+    result = {'stats': stats}
+
+    if request.action == 'leaderboard':
+        limit = min(max(int(params.get('limit', 10)), 1), MAX_LEADERBOARD_SIZE)
+        with conn.cursor(cursor_factory=instrumentation.TupleCursor) as rows_cur:
+            rows_cur.execute("""
+                SELECT id, username, balance, level, completed_tasks
+                FROM users
+                WHERE is_admin = FALSE AND is_blocked = FALSE
+                ORDER BY balance DESC, id DESC
+                LIMIT %s
+            """, (limit,))
+            result['leaders'] = encoder.rows(rows_cur.description, rows_cur.fetchall())
+
+    return core.respond(200, encoder.obj(**result))
+
+
+@router.route('GET', 'statement', access='user')
+def statement(request: core.Request) -> dict:
+    params, conn = request.params, request.conn
+    user_id = int(params['user_id']) if request.session['is_admin'] and params.get('user_id') else request.session['user_id']
+    limit = min(max(int(params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    conditions = ['user_id = %(user_id)s']
+    args = {'user_id': user_id, 'limit': limit + 1}
+
+    if params.get('cursor'):
+        cursor_created_at, cursor_id, cursor_balance = params['cursor'].rsplit(':', 2)
+        conditions.append('(created_at, id) < (%(created_at)s::timestamp, %(id)s)')
+        args.update(created_at=cursor_created_at, id=int(cursor_id), start=Decimal(cursor_balance))
+        start = '%(start)s'
+    else:
+        # баланс на первой странице читается тем же оператором, что и журнал: один снимок,
+        # и перевод, закоммиченный между запросами, не сдвигает balance_after
+        start = 'COALESCE((SELECT balance FROM users WHERE id = %(user_id)s), 0)'
+
+    with conn.cursor(cursor_factory=instrumentation.TupleCursor) as rows_cur:
+        rows_cur.execute(f"""
+            SELECT id, type, amount, delta,
+                   {start} - COALESCE(SUM(delta) OVER (
+                       ORDER BY created_at DESC, id DESC
+                       ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                   ), 0) AS balance_after,
+                   from_user_id, to_user_id, task_submission_id, transfer_id, description, created_at
+            FROM (
+                SELECT id, type, amount,
+                       CASE WHEN type IN ('send', 'reset') THEN -amount ELSE amount END AS delta,
+                       from_user_id, to_user_id, task_submission_id, transfer_id, description, created_at
+                FROM transactions
+                WHERE {' AND '.join(conditions)}
+                ORDER BY created_at DESC, id DESC
+                LIMIT %(limit)s
+            ) page
+            ORDER BY created_at DESC, id DESC
+        """, args)
+        entries = rows_cur.fetchall()
+        description = rows_cur.description
+
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        last = entries[-1]
+        next_cursor = f"{last[10].isoformat()}:{last[0]}:{last[4] - last[3]}"
+
+    return core.respond(200, encoder.obj(
+        user_id=user_id,
+        entries=encoder.rows(description, entries),
+        next_cursor=next_cursor
+    ))
+
+
+@router.route('GET', 'me', access='user')
+def me(request: core.Request) -> dict:
+    params, conn, cur = request.params, request.conn, request.cur
+    user_id = request.session['user_id']
+    # версию читаем до данных: если запись успеет проскочить между ними, клиент просто получит её ещё раз
+    cur.execute("SELECT version FROM user_versions WHERE user_id = %s", (user_id,))
+    row = cur.fetchone()
+    version = row['version'] if row else 0
+    etag = f'"me-{user_id}-{version}"'
+    response_headers = {'Access-Control-Expose-Headers': 'ETag', 'Cache-Control': 'no-cache', 'ETag': etag}
+    if params.get('version') == str(version) or etag in request.headers.get('if-none-match', ''):
+        return core.respond(304, '', response_headers)
+
+    since = int(params.get('since') or 0)
+    with conn.cursor(cursor_factory=instrumentation.TupleCursor) as rows_cur:
+        rows_cur.execute("""
+            SELECT id, username, email, balance, user_code, level, completed_tasks, is_blocked, is_admin, created_at
+            FROM users
+            WHERE id = %s
+        """, (user_id,))
+        profile = encoder.rows(rows_cur.description, rows_cur.fetchall())
+
+        rows_cur.execute("""
+            SELECT ts.id, ts.task_id, t.title AS task_title, t.reward, ts.status, ts.admin_comment,
+                   ts.submitted_at, ts.reviewed_at
+            FROM task_submissions ts
+            JOIN tasks t ON t.id = ts.task_id
+            WHERE ts.user_id = %s
+            ORDER BY ts.submitted_at DESC, ts.id DESC
+            LIMIT %s
+        """, (user_id, ME_SUBMISSIONS))
+        submissions = encoder.rows(rows_cur.description, rows_cur.fetchall())
+
+        rows_cur.execute("""
+            SELECT id, type, amount, from_user_id, to_user_id, task_submission_id, transfer_id, description, created_at
+            FROM transactions
+            WHERE user_id = %s AND id > %s
+            ORDER BY id
+            LIMIT %s
+        """, (user_id, since, ME_LEDGER_LIMIT + 1))
+        entries = rows_cur.fetchall()
+        has_more = len(entries) > ME_LEDGER_LIMIT
+        entries = entries[:ME_LEDGER_LIMIT]
+        ledger = encoder.rows(rows_cur.description, entries)
+
+    if has_more:
+        # неполный ответ не должен стать базой для 304: версию отдаём только с последней страницей журнала
+        version = None
+        del response_headers['ETag']
+
+    return core.respond(200, encoder.obj(
+        version=version,
+        user=encoder.Raw(profile[1:-1] or 'null'),
+        submissions=submissions,
+        ledger=ledger,
+        ledger_cursor=entries[-1][0] if entries else since,
+        has_more=has_more
+    ), response_headers)
+
+
+@router.route('GET', 'export', access='admin')
+def export(request: core.Request) -> dict:
+    import csv
+    import io
+    params, conn = request.params, request.conn
+    export_format = params.get('format', 'ndjson')
+    limit = min(max(int(params.get('limit', EXPORT_CHUNK_ROWS)), 1), MAX_EXPORT_CHUNK_ROWS)
+    after_id = int(params.get('cursor', 0))
+    out = io.StringIO()
+    last_id, exported = None, 0
+
+    with conn.cursor(name='ledger_export', cursor_factory=instrumentation.TupleCursor) as export_cur:
+        export_cur.itersize = EXPORT_FETCH_SIZE
+        export_cur.execute("""
+            SELECT id, user_id, type, amount, from_user_id, to_user_id, task_submission_id,
+                   transfer_id, description, created_at
+            FROM transactions
+            WHERE id > %s
+            ORDER BY id
+            LIMIT %s
+        """, (after_id, limit))
+        writer = csv.writer(out) if export_format == 'csv' else None
+        while True:
+            batch = export_cur.fetchmany(EXPORT_FETCH_SIZE)
+            if not batch:
+                break
+            if writer:
+                if exported == 0 and after_id == 0:
+                    writer.writerow([column.name for column in export_cur.description])
+                writer.writerows(batch)
+            else:
+                out.write(encoder.lines(export_cur.description, batch))
+                out.write('\n')
+            exported += len(batch)
+            last_id = batch[-1][0]
+
+    headers = {
+        'Content-Type': 'text/csv' if export_format == 'csv' else 'application/x-ndjson',
+        'Access-Control-Expose-Headers': 'X-Next-Cursor, X-Exported-Rows',
+        'X-Exported-Rows': str(exported)
+    }
+    if exported == limit:
+        headers['X-Next-Cursor'] = str(last_id)
+
+    return core.respond(200, out.getvalue(), headers)
+
+
+@router.route('GET', 'get_by_code')
+def get_by_code(request: core.Request) -> dict:
+    code = request.params.get('code') or ''
+    user = code_cache.lookup([code], lambda: request.cur)[code]
+
+    if not user or user['is_blocked']:
+        return core.error(404, 'Пользователь не найден')
+
+    return core.ok(user={'id': user['id'], 'username': user['username'], 'user_code': user['user_code']})
+
+
+@router.route('GET', 'get_by_codes')
+def get_by_codes(request: core.Request) -> dict:
+    params = request.params
+    codes = [code.strip() for code in (params.get('codes') or '').split(',') if code.strip()][:MAX_CODE_BATCH]
+    found = code_cache.lookup(codes, lambda: request.cur)
+
+    return core.ok(users={
+        code: {'id': user['id'], 'username': user['username'], 'user_code': code}
+        if user and not user['is_blocked'] else None
+        for code, user in found.items()
+    })
+
+
+@router.route('POST', 'transfer', access='user')
+def transfer(request: core.Request) -> dict:
+    body = request.body
+    from_user_id = request.session['user_id']
+    idempotency_key = body.get('idempotency_key')
+
+    try:
+        amount = Decimal(str(body.get('amount', '0')))
+    except InvalidOperation:
+        amount = Decimal('NaN')
+    if not amount.is_finite() or not 0 < amount.quantize(Decimal('0.01')) < MAX_TRANSFER_AMOUNT:
+        return core.error(400, 'Некорректная сумма перевода')
+    amount = amount.quantize(Decimal('0.01'))
+    if idempotency_key is not None and (not isinstance(idempotency_key, str) or len(idempotency_key) > 64):
+        return core.error(400, 'Некорректный ключ идемпотентности')
+
+    if body.get('to_user_code'):
+        to_user_code = str(body['to_user_code'])
+        recipient = code_cache.lookup([to_user_code], lambda: request.cur)[to_user_code]
+        to_user_id = recipient['id'] if recipient else None
+    else:
+        to_user_id = body.get('to_user_id')
+
+    try:
+        to_user_id = int(to_user_id) if to_user_id else None
+    except (TypeError, ValueError):
+        to_user_id = None
+    if not to_user_id or to_user_id == from_user_id:
+        return core.error(400, 'Некорректный получатель или сумма перевода')
+
+    conn, cur = request.conn, request.cur
+    # счета блокируются до вставки в transfers: несуществующий получатель даёт 404, а не
+    # ошибку внешнего ключа, и FK-проверка потом берёт KEY SHARE на уже свои строки.
+    # NO KEY UPDATE совместим с чужим KEY SHARE, порядок по id исключает взаимоблокировки
+    cur.execute("""
+        SELECT id, balance, is_blocked
+        FROM users
+        WHERE id IN (%s, %s)
+        ORDER BY id
+        FOR NO KEY UPDATE
+    """, (from_user_id, to_user_id))
+    accounts = {row['id']: row for row in cur.fetchall()}
+    sender = accounts.get(from_user_id)
+    recipient = accounts.get(to_user_id)
+
+    if not sender or not recipient:
+        conn.rollback()
+        return core.error(404, 'Пользователь не найден')
+
+    cur.execute("""
+        INSERT INTO transfers (idempotency_key, from_user_id, to_user_id, amount)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (idempotency_key) DO NOTHING
+        RETURNING id
+    """, (idempotency_key, from_user_id, to_user_id, amount))
+    transfer = cur.fetchone()
+
+    if not transfer:
+        conn.rollback()
+        cur.execute("""
+            SELECT id, from_user_id, to_user_id, amount, created_at
+            FROM transfers
+            WHERE idempotency_key = %s
+        """, (idempotency_key,))
+        existing = cur.fetchone()
+        same = (existing['from_user_id'], existing['to_user_id'], existing['amount']) == (from_user_id, to_user_id, amount)
+
+        if not same:
+            return core.error(409, 'Ключ идемпотентности уже использован для другого перевода')
+        return core.ok(transfer=dict(existing), replayed=True)
+
+    if sender['is_blocked'] or recipient['is_blocked']:
+        error, status_code = 'Пользователь не найден', 404
+    elif sender['balance'] < amount:
+        error, status_code = 'Недостаточно средств', 400
+    else:
+        error = None
+
+    if error:
+        conn.rollback()
+        return core.error(status_code, error)
+
+    cur.execute("""
+        WITH moved AS (
+            UPDATE users
+            SET balance = balance + CASE WHEN id = %(from)s THEN -%(amount)s ELSE %(amount)s END,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id IN (%(from)s, %(to)s)
+            RETURNING id, balance
+        ), ledger AS (
+            INSERT INTO transactions (user_id, type, amount, from_user_id, to_user_id, transfer_id, description)
+            VALUES
+                (%(from)s, 'send', %(amount)s, %(from)s, %(to)s, %(transfer)s, 'Перевод пользователю'),
+                (%(to)s, 'receive', %(amount)s, %(from)s, %(to)s, %(transfer)s, 'Перевод от пользователя')
+        )
+        SELECT id, balance FROM moved
+    """, {'from': from_user_id, 'to': to_user_id, 'amount': amount, 'transfer': transfer['id']})
+    balances = {row['id']: row['balance'] for row in cur.fetchall()}
+    conn.commit()
+
+    return core.ok(
+        transfer={'id': transfer['id'], 'from_user_id': from_user_id, 'to_user_id': to_user_id, 'amount': amount},
+        balance=balances[from_user_id],
+        replayed=False
+    )
+
+
+@router.route('PUT', 'block', access='admin')
+def block(request: core.Request) -> dict:
+    body, conn, cur = request.body, request.conn, request.cur
+    user_id = body.get('user_id')
+    is_blocked = body.get('is_blocked', True)
+
+    cur.execute("""
+        UPDATE users
+        SET is_blocked = %s
+        WHERE id = %s
+        RETURNING id, username, is_blocked
+    """, (is_blocked, user_id))
+
+    user = cur.fetchone()
+    conn.commit()
+    tokens.forget(user_id)
+    code_cache.invalidate(user_id)
+
+    return core.ok(user=dict(user))
+
+
+@router.route('PUT', 'add_balance', access='admin')
+def add_balance(request: core.Request) -> dict:
+    body, conn, cur = request.body, request.conn, request.cur
+    user_id = body.get('user_id')
+    amount = body.get('amount')
+    admin_id = request.session['user_id']
+
+    cur.execute("""
+        UPDATE users
+        SET balance = balance + %s
+        WHERE id = %s
+        RETURNING id, username, balance
+    """, (amount, user_id))
+
+    user = cur.fetchone()
+
+    cur.execute("""
+        INSERT INTO transactions (user_id, type, amount, from_user_id, description)
+        VALUES (%s, 'admin', %s, %s, 'Начисление администратором')
+    """, (user_id, amount, admin_id))
+
+    conn.commit()
+
+    return core.ok(user=dict(user))
+
+
+@router.route('PUT', 'reset_all', access='admin')
+def reset_all(request: core.Request) -> dict:
+    body, conn, cur = request.body, request.conn, request.cur
+    batch_size = min(max(int(body.get('batch_size', RESET_BATCH_SIZE)), 1), MAX_RESET_BATCH_SIZE)
+    deadline = time.monotonic() + RESET_TIME_BUDGET
+
+    cur.execute("""
+        INSERT INTO balance_resets (total_users, started_by)
+        SELECT COUNT(*), %s FROM users WHERE is_admin = FALSE
+        ON CONFLICT DO NOTHING
+        RETURNING id
+    """, (request.session['user_id'],))
+    started = cur.fetchone()
+    conn.commit()
+    if not started:
+        cur.execute("SELECT id FROM balance_resets WHERE finished_at IS NULL")
+        started = cur.fetchone()
+
+    reset = None
+    while started and time.monotonic() < deadline:
+        cur.execute("""
+            WITH run AS (
+                SELECT id, last_user_id
+                FROM balance_resets
+                WHERE id = %(reset_id)s AND finished_at IS NULL
+                FOR UPDATE
+            ), batch AS (
+                SELECT u.id, u.balance
+                FROM users u
+                JOIN run ON u.id > run.last_user_id
+                WHERE u.is_admin = FALSE
+                ORDER BY u.id
+                LIMIT %(batch_size)s
+                FOR NO KEY UPDATE OF u
+            ), reset AS (
+                UPDATE users u
+                SET balance = 0, updated_at = CURRENT_TIMESTAMP
+                FROM batch
+                WHERE u.id = batch.id AND batch.balance <> 0
+                RETURNING u.id, batch.balance
+            ), ledger AS (
+                INSERT INTO transactions (user_id, type, amount, description)
+                SELECT id, 'reset', balance, 'Сброс баланса'
+                FROM reset
+            )
+            UPDATE balance_resets r
+            SET last_user_id = COALESCE((SELECT MAX(id) FROM batch), r.last_user_id),
+                users_scanned = r.users_scanned + (SELECT COUNT(*) FROM batch),
+                users_reset = r.users_reset + (SELECT COUNT(*) FROM reset),
+                total_amount = r.total_amount + COALESCE((SELECT SUM(balance) FROM reset), 0),
+                finished_at = CASE WHEN (SELECT COUNT(*) FROM batch) < %(batch_size)s THEN CURRENT_TIMESTAMP END
+            FROM run
+            WHERE r.id = run.id
+            RETURNING r.id, r.total_users, r.users_scanned, r.users_reset, r.total_amount,
+                      r.started_at, r.finished_at
+        """, {'reset_id': started['id'], 'batch_size': batch_size})
+        reset = cur.fetchone()
+        conn.commit()
+        if not reset or reset['finished_at']:
+            break
+
+    if not reset:
+        cur.execute("""
+            SELECT id, total_users, users_scanned, users_reset, total_amount, started_at, finished_at
+            FROM balance_resets
+            ORDER BY id DESC
+            LIMIT 1
+        """)
+        reset = cur.fetchone()
+
+    reset = dict(reset)
+    reset['done'] = reset['finished_at'] is not None
+
+    return core.ok(success=True, reset=reset)
+
+
+@router.route('PUT', 'reconcile', access='admin')
+def reconcile(request: core.Request) -> dict:
+    """Сверка балансов с журналом: снимок + записи после него против users.balance, батчами по пользователям.
+    Заодно переносит снимки вперёд до горизонта — записей старше SNAPSHOT_LAG, которые уже точно закоммичены"""
+    body, conn, cur = request.body, request.conn, request.cur
+    batch_size = min(max(int(body.get('batch_size', RECONCILE_BATCH_SIZE)), 1), MAX_RECONCILE_BATCH_SIZE)
+    deadline = time.monotonic() + RECONCILE_TIME_BUDGET
+
+    cur.execute("""
+        INSERT INTO reconciliation_runs (horizon_id, started_by)
+        SELECT COALESCE((
+            SELECT id FROM transactions
+            WHERE created_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+            ORDER BY id DESC
+            LIMIT 1
+        ), 0), %s
+        ON CONFLICT DO NOTHING
+        RETURNING id
+    """, (SNAPSHOT_LAG, request.session['user_id']))
+    started = cur.fetchone()
+    conn.commit()
+    if not started:
+        cur.execute("SELECT id FROM reconciliation_runs WHERE finished_at IS NULL")
+        started = cur.fetchone()
+
+    run = None
+    while started and time.monotonic() < deadline:
+        cur.execute("""
+            WITH run AS (
+                SELECT id, last_user_id, horizon_id
+                FROM reconciliation_runs
+                WHERE id = %(run_id)s AND finished_at IS NULL
+                FOR UPDATE
+            ), batch AS (
+                SELECT u.id, u.balance
+                FROM users u
+                JOIN run ON u.id > run.last_user_id
+                ORDER BY u.id
+                LIMIT %(batch_size)s
+            ), latest AS (
+                SELECT b.id AS user_id, b.balance AS actual,
+                       COALESCE(s.ledger_id, 0) AS ledger_id, COALESCE(s.balance, 0) AS snapshot_balance
+                FROM batch b
+                LEFT JOIN LATERAL (
+                    SELECT ledger_id, balance
+                    FROM balance_snapshots
+                    WHERE user_id = b.id
+                    ORDER BY ledger_id DESC
+                    LIMIT 1
+                ) s ON TRUE
+            ), deltas AS (
+                SELECT l.user_id,
+                       COALESCE(SUM(t.delta), 0) AS total,
+                       COALESCE(SUM(t.delta) FILTER (WHERE t.id <= run.horizon_id), 0) AS to_horizon,
+                       MAX(t.id) FILTER (WHERE t.id <= run.horizon_id) AS horizon_ledger_id
+                FROM latest l
+                CROSS JOIN run
+                LEFT JOIN LATERAL (
+                    SELECT id, CASE WHEN type IN ('send', 'reset') THEN -amount ELSE amount END AS delta
+                    FROM transactions
+                    WHERE user_id = l.user_id AND id > l.ledger_id
+                ) t ON TRUE
+                GROUP BY l.user_id
+            ), snapshots AS (
+                INSERT INTO balance_snapshots (user_id, ledger_id, balance)
+                SELECT l.user_id, d.horizon_ledger_id, l.snapshot_balance + d.to_horizon
+                FROM latest l
+                JOIN deltas d ON d.user_id = l.user_id
+                WHERE d.horizon_ledger_id IS NOT NULL
+                ON CONFLICT DO NOTHING
+                RETURNING user_id
+            ), drift AS (
+                INSERT INTO ledger_drift (run_id, user_id, expected, actual)
+                SELECT %(run_id)s, l.user_id, l.snapshot_balance + d.total, l.actual
+                FROM latest l
+                JOIN deltas d ON d.user_id = l.user_id
+                WHERE l.snapshot_balance + d.total <> l.actual
+                RETURNING user_id
+            )
+            UPDATE reconciliation_runs r
+            SET last_user_id = COALESCE((SELECT MAX(id) FROM batch), r.last_user_id),
+                users_checked = r.users_checked + (SELECT COUNT(*) FROM batch),
+                users_drifted = r.users_drifted + (SELECT COUNT(*) FROM drift),
+                snapshots_taken = r.snapshots_taken + (SELECT COUNT(*) FROM snapshots),
+                finished_at = CASE WHEN (SELECT COUNT(*) FROM batch) < %(batch_size)s THEN CURRENT_TIMESTAMP END
+            FROM run
+            WHERE r.id = run.id
+            RETURNING r.id, r.horizon_id, r.users_checked, r.users_drifted, r.snapshots_taken,
+                      r.started_at, r.finished_at
+        """, {'run_id': started['id'], 'batch_size': batch_size})
+        run = cur.fetchone()
+        conn.commit()
+        if not run or run['finished_at']:
+            break
+
+    if not run:
+        cur.execute("""
+            SELECT id, horizon_id, users_checked, users_drifted, snapshots_taken, started_at, finished_at
+            FROM reconciliation_runs
+            ORDER BY id DESC
+            LIMIT 1
+        """)
+        run = cur.fetchone()
+
+    if not run:
+        return core.ok(success=True, run=None, drift=[])
+
+    run = dict(run)
+    run['done'] = run['finished_at'] is not None
+    cur.execute("""
+        SELECT d.user_id, u.username, d.expected, d.actual, d.actual - d.expected AS difference
+        FROM ledger_drift d
+        JOIN users u ON u.id = d.user_id
+        WHERE d.run_id = %s
+        ORDER BY ABS(d.actual - d.expected) DESC, d.user_id
+        LIMIT %s
+    """, (run['id'], MAX_DRIFT_REPORT))
+
+    return core.ok(success=True, run=run, drift=[dict(row) for row in cur.fetchall()])
+
+
+@instrumentation.instrumented('users')
+@compression.compressed
 def handler(event: dict, context) -> dict:
     """API для управления пользователями и их балансами"""
-    
-    method = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    try:
-        dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        if method == 'GET':
-            params = event.get('queryStringParameters') or {}
-            action = params.get('action', 'list')
-            
-            if action == 'list':
-                cur.execute("""
-                    SELECT id, username, email, balance, user_code, level, completed_tasks, is_blocked
-                    FROM users
-                    WHERE is_admin = FALSE
-                    ORDER BY balance DESC
-                """)
-                users = cur.fetchall()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'users': [dict(u) for u in users]}, default=str),
-                    'isBase64Encoded': False
-                }
-            
-            elif action == 'get_by_code':
-                code = params.get('code')
-                cur.execute("""
-                    SELECT id, username, user_code
-                    FROM users
-                    WHERE user_code = %s AND is_blocked = FALSE
-                """, (code,))
-                user = cur.fetchone()
-                
-                if not user:
-                    return {
-                        'statusCode': 404,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Пользователь не найден'}),
-                        'isBase64Encoded': False
-                    }
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'user': dict(user)}),
-                    'isBase64Encoded': False
-                }
-        
-        elif method == 'PUT':
-            body = json.loads(event.get('body', '{}'))
-            action = body.get('action')
-            
-            if action == 'block':
-                user_id = body.get('user_id')
-                is_blocked = body.get('is_blocked', True)
-                
-                cur.execute("""
-                    UPDATE users
-                    SET is_blocked = %s
-                    WHERE id = %s
-                    RETURNING id, username, is_blocked
-                """, (is_blocked, user_id))
-                
-                user = cur.fetchone()
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'user': dict(user)}),
-                    'isBase64Encoded': False
-                }
-            
-            elif action == 'add_balance':
-                user_id = body.get('user_id')
-                amount = body.get('amount')
-                admin_id = body.get('admin_id')
-                
-                cur.execute("""
-                    UPDATE users
-                    SET balance = balance + %s
-                    WHERE id = %s
-                    RETURNING id, username, balance
-                """, (amount, user_id))
-                
-                user = cur.fetchone()
-                
-                cur.execute("""
-                    INSERT INTO transactions (user_id, type, amount, description)
-                    VALUES (%s, 'admin', %s, 'Начисление администратором')
-                """, (user_id, amount))
-                
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'user': dict(user)}),
-                    'isBase64Encoded': False
-                }
-            
-            elif action == 'reset_all':
-                cur.execute("""
-                    UPDATE users
-                    SET balance = 0
-                    WHERE is_admin = FALSE
-                """)
-                
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True}),
-                    'isBase64Encoded': False
-                }
-        
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
-    
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
+    return router.dispatch(event)
@@ -0,0 +1,57 @@
+"""Общие утилиты бенчмарков: загрузка обработчиков функций и перцентили"""
+import importlib.util
+import json
+import os
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+
+
+def load_module(function_name: str, module_name: str = 'index'):
+    """Импортирует backend/<function_name>/<module_name>.py так, как это делает рантайм функции"""
+    function_dir = os.path.join(BACKEND_DIR, function_name)
+    for name, module in list(sys.modules.items()):
+        if (getattr(module, '__file__', None) or '').startswith(BACKEND_DIR):
+            del sys.modules[name]
+    sys.path.insert(0, function_dir)
+    try:
+        spec = importlib.util.spec_from_file_location(
+            f'{function_name}_{module_name}', os.path.join(function_dir, f'{module_name}.py')
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(function_dir)
+    return module
+
+
+def load_handler(function_name: str):
+    return load_module(function_name).handler
+
+
+def make_event(method: str, body: dict = None, params: dict = None, headers: dict = None) -> dict:
+    return {
+        'httpMethod': method,
+        'body': json.dumps(body) if body is not None else '',
+        'queryStringParameters': params or {},
+        'headers': headers or {}
+    }
+
+
+def percentile(samples: list, p: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summary(samples: list, elapsed: float) -> dict:
+    """p50/p95/p99 в миллисекундах и пропускная способность в запросах в секунду"""
+    return {
+        'requests': len(samples),
+        'rps': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3)
+    }
@@ -0,0 +1,80 @@
+"""Холодный старт функций: каждое измерение — новый процесс интерпретатора.
+Меряет импорт index.py, первый OPTIONS (без БД) и, если задан DATABASE_URL,
+первый настоящий запрос, которому нужно соединение.
+
+    python benchmarks/cold_start.py --runs 10
+    DATABASE_URL=postgresql://... python benchmarks/cold_start.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+FIRST_REQUESTS = {
+    'auth': ('POST', {'action': 'login', 'username': 'cold_start_probe', 'password': '-'}, None),
+    'users': ('GET', None, {'action': 'stats'}),
+    'tasks': ('GET', None, {'action': 'list'}),
+    'submissions': ('GET', None, {'action': 'counts'})
+}
+
+PROBE = '''
+import json, sys, time
+sys.path.insert(0, {benchmarks_dir!r})
+started = time.perf_counter()
+from _common import load_handler, make_event
+before = set(sys.modules)
+handler = load_handler({function!r})
+imported = time.perf_counter()
+handler(make_event('OPTIONS'), None)
+options = time.perf_counter()
+result = {{
+    'import_ms': (imported - started) * 1000,
+    'first_options_ms': (options - imported) * 1000,
+    'modules': len(set(sys.modules) - before),
+    'psycopg2_at_import': 'psycopg2' in sys.modules
+}}
+if {with_db!r}:
+    method, body, params = {first_request!r}
+    handler(make_event(method, body, params), None)
+    result['first_request_ms'] = (time.perf_counter() - options) * 1000
+    second = time.perf_counter()
+    handler(make_event(method, body, params), None)
+    result['warm_request_ms'] = (time.perf_counter() - second) * 1000
+print(json.dumps(result))
+'''
+
+
+def probe(function: str, with_db: bool) -> dict:
+    code = PROBE.format(
+        benchmarks_dir=os.path.dirname(os.path.abspath(__file__)),
+        function=function,
+        with_db=with_db,
+        first_request=FIRST_REQUESTS[function]
+    )
+    env = dict(os.environ, LOG_REQUESTS='0', SESSION_SECRET=os.environ.get('SESSION_SECRET', 'bench-secret'))
+    output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--functions', default=','.join(FIRST_REQUESTS))
+    args = parser.parse_args()
+
+    with_db = bool(os.environ.get('DATABASE_URL'))
+    results = {}
+    for function in args.functions.split(','):
+        samples = [probe(function, with_db) for _ in range(args.runs)]
+        summary = {'modules': samples[-1]['modules'], 'psycopg2_at_import': samples[-1]['psycopg2_at_import']}
+        for field in ('import_ms', 'first_options_ms', 'first_request_ms', 'warm_request_ms'):
+            if field in samples[0]:
+                summary[field] = round(statistics.median(s[field] for s in samples), 2)
+        results[function] = summary
+    print(json.dumps({'runs': args.runs, 'with_db': with_db, 'functions': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Цена сжатия ответов: время gzip/deflate на каждом уровне против сэкономленных байт.
+Тело — список пользователей, закодированный так же, как users action=list.
+
+    python benchmarks/compression.py --rows 2000 --levels 1,6,9
+"""
+import argparse
+import base64
+import json
+import time
+
+from _common import load_module
+from json_encoder import DESCRIPTION, make_rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--levels', default='1,6,9')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    encoder = load_module('users', 'encoder')
+    compression = load_module('users', 'compression')
+    body = encoder.obj(users=encoder.rows(DESCRIPTION, make_rows(args.rows)), next_cursor=None)
+    raw_bytes = len(body.encode())
+
+    results = []
+    for encoding in ('gzip', 'deflate'):
+        for level in [int(level) for level in args.levels.split(',')]:
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                payload = base64.b64encode(compression.compress(body, encoding, level))
+                timings.append(time.perf_counter() - started)
+            cpu_ms = min(timings) * 1000
+            saved = raw_bytes - len(payload)
+            results.append({
+                'encoding': encoding,
+                'level': level,
+                'cpu_ms': round(cpu_ms, 3),
+                'wire_bytes': len(payload),
+                'ratio': round(len(payload) / raw_bytes, 3),
+                'saved_kb_per_cpu_ms': round(saved / 1024 / cpu_ms, 1)
+            })
+    print(json.dumps({'rows': args.rows, 'raw_bytes': raw_bytes, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
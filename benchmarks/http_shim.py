@@ -0,0 +1,65 @@
+"""Локальный HTTP-шим: /<function>/?query -> handler(event) из backend/<function>/index.py.
+
+    DATABASE_URL=postgresql://... python benchmarks/http_shim.py --port 8765
+"""
+import argparse
+import base64
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from _common import load_handler
+
+FUNCTIONS = ('auth', 'users', 'tasks', 'submissions')
+
+
+def make_server(port: int) -> ThreadingHTTPServer:
+    handlers = {name: load_handler(name) for name in FUNCTIONS}
+
+    class Shim(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _dispatch(self) -> None:
+            url = urlsplit(self.path)
+            function = url.path.strip('/').split('/')[0]
+            if function not in handlers:
+                self.send_error(404)
+                return
+            length = int(self.headers.get('Content-Length') or 0)
+            event = {
+                'httpMethod': self.command,
+                'headers': dict(self.headers.items()),
+                'queryStringParameters': dict(parse_qsl(url.query)),
+                'body': self.rfile.read(length).decode() if length else ''
+            }
+            response = handlers[function](event, None)
+            body = response.get('body') or ''
+            payload = base64.b64decode(body) if response.get('isBase64Encoded') else body.encode()
+            self.send_response(response['statusCode'])
+            for name, value in (response.get('headers') or {}).items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = do_POST = do_PUT = do_OPTIONS = _dispatch
+
+        def log_message(self, format, *args) -> None:
+            pass
+
+    return ThreadingHTTPServer(('127.0.0.1', port), Shim)
+
+
+def start_in_background(port: int) -> ThreadingHTTPServer:
+    server = make_server(port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    print(json.dumps({'listening': f'http://127.0.0.1:{args.port}', 'functions': FUNCTIONS}))
+    make_server(args.port).serve_forever()
@@ -0,0 +1,73 @@
+"""Микробенчмарк сериализации списков: прежний путь (строки-dict как из RealDictCursor,
+затем json.dumps([dict(r) ...], default=str))
+против encoder.rows по кортежам и OID-типам колонок.
+
+    python benchmarks/json_encoder.py --rows 10000 --repeat 20
+"""
+import argparse
+import json
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from _common import load_module
+
+Column = namedtuple('Column', 'name type_code')
+
+DESCRIPTION = [
+    Column('id', 23), Column('username', 1043), Column('email', 1043), Column('balance', 1700),
+    Column('user_code', 1043), Column('level', 23), Column('completed_tasks', 23), Column('is_blocked', 16),
+    Column('created_at', 1114)
+]
+
+
+def make_rows(count: int) -> list:
+    started = datetime(2024, 1, 1)
+    return [
+        (n, f'user_{n}', f'user_{n}@example.com', Decimal(n * 37 % 100000) / 100, str(10 ** 19 + n),
+         1 + n % 20, n % 100, n % 50 == 0, started + timedelta(seconds=n))
+        for n in range(count)
+    ]
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    encoder = load_module('users', 'encoder')
+    rows = make_rows(args.rows)
+    names = [column.name for column in DESCRIPTION]
+
+    def legacy() -> str:
+        dict_rows = [dict(zip(names, row)) for row in rows]
+        return json.dumps({'users': [dict(r) for r in dict_rows]}, default=str)
+
+    def fast() -> str:
+        return encoder.obj(users=encoder.rows(DESCRIPTION, rows))
+
+    assert [r['id'] for r in json.loads(legacy())['users']] == [r['id'] for r in json.loads(fast())['users']]
+    legacy_s, fast_s = best_of(legacy, args.repeat), best_of(fast, args.repeat)
+    print(json.dumps({
+        'rows': args.rows,
+        'legacy_ms': round(legacy_s * 1000, 2),
+        'encoder_ms': round(fast_s * 1000, 2),
+        'speedup': round(legacy_s / fast_s, 2),
+        'legacy_bytes': len(legacy()),
+        'encoder_bytes': len(fast())
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
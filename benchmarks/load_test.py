@@ -0,0 +1,191 @@
+"""Нагрузочный прогон смешанной нагрузки по обработчикам функций.
+
+Запросы берутся из benchmarks/workload.json (веса, ожидаемые статусы) и, с --tests,
+из backend/*/tests.json. Обработчики вызываются напрямую или через HTTP-шим (--http).
+Для каждого действия печатаются rps и p50/p95/p99; --save-baseline сохраняет результат,
+--baseline сравнивает с сохранённым и завершается с кодом 1 при регрессии.
+
+    DATABASE_URL=postgresql://... python benchmarks/seed.py
+    DATABASE_URL=postgresql://... python benchmarks/load_test.py --concurrency 32 --duration 60 --save-baseline baseline.json
+    DATABASE_URL=postgresql://... python benchmarks/load_test.py --concurrency 32 --duration 60 --baseline baseline.json
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import parse_qsl, urlsplit
+
+import psycopg2
+
+from _common import BACKEND_DIR, load_handler, load_module, summary
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_requests(workload_path: str, include_tests: bool) -> list:
+    with open(workload_path) as f:
+        requests = json.load(f)['requests']
+    if include_tests:
+        for path in sorted(glob.glob(os.path.join(BACKEND_DIR, '*', 'tests.json'))):
+            function = os.path.basename(os.path.dirname(path))
+            with open(path) as f:
+                for test in json.load(f)['tests']:
+                    requests.append(dict(test, function=function, weight=1))
+    return requests
+
+
+def session_tokens() -> dict:
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM users WHERE is_admin = TRUE ORDER BY id LIMIT 1")
+    admin = cur.fetchone()
+    cur.execute("SELECT id FROM users WHERE is_admin = FALSE AND is_blocked = FALSE ORDER BY id LIMIT 1")
+    user = cur.fetchone()
+    conn.close()
+    tokens = load_module('users', 'tokens')
+    return {
+        'admin': tokens.issue(admin[0], True) if admin else None,
+        'user': tokens.issue(user[0], False) if user else None
+    }
+
+
+def build_call(request: dict, tokens: dict, handlers: dict, base_url: str):
+    url = urlsplit(request.get('path', '/'))
+    headers = {'Content-Type': 'application/json'}
+    if request.get('auth') and tokens.get(request['auth']):
+        headers['X-Auth-Token'] = tokens[request['auth']]
+    body = json.dumps(request['body']) if 'body' in request else ''
+
+    if base_url:
+        target = f"{base_url}/{request['function']}/?{url.query}"
+
+        def call() -> int:
+            req = urllib.request.Request(target, data=body.encode() or None, headers=headers, method=request['method'])
+            try:
+                with urllib.request.urlopen(req) as response:
+                    response.read()
+                    return response.status
+            except urllib.error.HTTPError as error:
+                return error.code
+        return call
+
+    handler = handlers[request['function']]
+    event = {
+        'httpMethod': request['method'],
+        'headers': headers,
+        'queryStringParameters': dict(parse_qsl(url.query)),
+        'body': body
+    }
+    return lambda: handler(dict(event), None)['statusCode']
+
+
+def run(requests: list, calls: list, concurrency: int, duration: float) -> dict:
+    weights = [r.get('weight', 1) for r in requests]
+    samples = {i: [] for i in range(len(requests))}
+    errors = {i: 0 for i in range(len(requests))}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(seed: int) -> None:
+        rnd = random.Random(seed)
+        local = {i: [] for i in range(len(requests))}
+        local_errors = {i: 0 for i in range(len(requests))}
+        while time.monotonic() < deadline:
+            i = rnd.choices(range(len(requests)), weights)[0]
+            started = time.perf_counter()
+            try:
+                status = calls[i]()
+            except Exception:
+                status = None
+            local[i].append(time.perf_counter() - started)
+            if status != requests[i].get('expectedStatus', 200):
+                local_errors[i] += 1
+        with lock:
+            for i in local:
+                samples[i].extend(local[i])
+                errors[i] += local_errors[i]
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    report = {}
+    for i, request in enumerate(requests):
+        key = f"{request['function']} {request['name']}"
+        report[key] = dict(summary(samples[i], elapsed), errors=errors[i])
+    all_samples = [s for values in samples.values() for s in values]
+    report['total'] = dict(summary(all_samples, elapsed), errors=sum(errors.values()))
+    return report
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list:
+    found = []
+    for key, base in baseline.items():
+        current = report.get(key)
+        if not current or not base['requests']:
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            found.append(f"{key}: p95 {current['p95_ms']}ms > baseline {base['p95_ms']}ms")
+        if current['rps'] < base['rps'] * (1 - tolerance):
+            found.append(f"{key}: rps {current['rps']} < baseline {base['rps']}")
+        if current['errors'] > base['errors']:
+            found.append(f"{key}: errors {current['errors']} > baseline {base['errors']}")
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workload', default=os.path.join(BENCH_DIR, 'workload.json'))
+    parser.add_argument('--tests', action='store_true', help='добавить кейсы из backend/*/tests.json')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--http', action='store_true', help='через локальный HTTP-шим вместо прямого вызова')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--save-baseline')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    os.environ.setdefault('SESSION_SECRET', 'bench-secret')
+    os.environ.setdefault('LOG_REQUESTS', '0')
+    # весь поток идёт с одного адреса и по нескольким именам — лимит входа здесь не меряем
+    os.environ.setdefault('LOGIN_IP_LIMIT', '1000000000')
+    os.environ.setdefault('LOGIN_USER_LIMIT', '1000000000')
+    requests = load_requests(args.workload, args.tests)
+    tokens = session_tokens()
+
+    base_url, handlers = None, {}
+    if args.http:
+        from http_shim import start_in_background
+        start_in_background(args.port)
+        base_url = f'http://127.0.0.1:{args.port}'
+    else:
+        handlers = {name: load_handler(name) for name in {r['function'] for r in requests}}
+
+    calls = [build_call(r, tokens, handlers, base_url) for r in requests]
+    report = run(requests, calls, args.concurrency, args.duration)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(report, json.load(f), args.tolerance)
+        for line in found:
+            print(f'REGRESSION {line}')
+        if found:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Накладные расходы лимитера входа на запрос: check + attempt (+ failed для части запросов)
+в памяти, без БД. Ключи — случайные адреса и имена из пула --keys; при пуле больше
+--max-keys меряется и вытеснение старых ключей.
+
+    python benchmarks/login_limiter.py --requests 200000 --keys 10000,100000,1000000
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from _common import load_module, percentile
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200000)
+    parser.add_argument('--keys', default='10000,100000,1000000')
+    parser.add_argument('--max-keys', type=int, default=50000)
+    parser.add_argument('--failed-share', type=float, default=0.3)
+    args = parser.parse_args()
+
+    os.environ['LOGIN_LIMIT_MAX_KEYS'] = str(args.max_keys)
+    os.environ['LOGIN_LIMIT_SHARED'] = '0'
+    results = []
+    for key_count in [int(k) for k in args.keys.split(',')]:
+        login_limit = load_module('auth', 'login_limit')
+        rng = random.Random(key_count)
+        events = [
+            login_limit.keys(
+                {'headers': {'X-Forwarded-For': f'10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}'}},
+                f'user_{rng.randrange(key_count)}'
+            )
+            for n in (rng.randrange(key_count) for _ in range(args.requests))
+        ]
+        failed = [rng.random() < args.failed_share for _ in events]
+
+        timings = []
+        throttled = 0
+        started = time.perf_counter()
+        for login_keys, is_failed in zip(events, failed):
+            t0 = time.perf_counter()
+            if login_limit.check(login_keys):
+                throttled += 1
+            else:
+                login_limit.attempt(login_keys)
+                if is_failed:
+                    login_limit.failed(None, None, login_keys)
+            timings.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+
+        results.append({
+            'keys': key_count,
+            'requests': args.requests,
+            'throttled': throttled,
+            'avg_us': round(elapsed / args.requests * 1e6, 2),
+            'p50_us': round(percentile(timings, 50) * 1e6, 2),
+            'p99_us': round(percentile(timings, 99) * 1e6, 2),
+            'tracked_users': len(login_limit._users),
+            'tracked_ips': len(login_limit._ips)
+        })
+    print(json.dumps({'max_keys': args.max_keys, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
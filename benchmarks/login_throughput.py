@@ -0,0 +1,85 @@
+"""Стоимость PBKDF2 при входе: p50/p99 и запросы в секунду для каждого числа итераций.
+
+По умолчанию меряет только проверку пароля (CPU). С --handler гоняет полный auth
+action=login через обработчик против DATABASE_URL с пользователем bench_login.
+
+    python benchmarks/login_throughput.py --costs 60000,120000,310000,600000 --threads 4
+    DATABASE_URL=postgresql://... python benchmarks/login_throughput.py --handler
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+from _common import load_handler, load_module, make_event, summary
+
+PASSWORD = 'bench-password-123'
+
+
+def run(call, threads: int, requests: int) -> dict:
+    latencies = []
+    lock = threading.Lock()
+    per_thread = max(1, requests // threads)
+
+    def worker() -> None:
+        local = []
+        for _ in range(per_thread):
+            started = time.perf_counter()
+            call()
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return summary(latencies, time.perf_counter() - started)
+
+
+def prepare_user(passwords) -> None:
+    import psycopg2
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO users (username, email, email_password, password_hash, user_code)
+        VALUES ('bench_login', 'bench_login@bench.local', '-', %s, '77777777777777777777')
+        ON CONFLICT (username) DO UPDATE SET password_hash = EXCLUDED.password_hash, is_blocked = FALSE
+    """, (passwords.hash_password(PASSWORD),))
+    conn.commit()
+    conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--costs', default='60000,120000,310000,600000')
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--handler', action='store_true', help='полный login через обработчик и БД')
+    args = parser.parse_args()
+
+    os.environ.setdefault('SESSION_SECRET', 'bench-secret')
+    # весь поток идёт с одного адреса и по нескольким именам — лимит входа здесь не меряем
+    os.environ.setdefault('LOGIN_IP_LIMIT', '1000000000')
+    os.environ.setdefault('LOGIN_USER_LIMIT', '1000000000')
+    results = {}
+    for cost in [int(c) for c in args.costs.split(',')]:
+        os.environ['PASSWORD_HASH_ITERATIONS'] = str(cost)
+        if args.handler:
+            passwords = load_module('auth', 'passwords')
+            prepare_user(passwords)
+            handler = load_handler('auth')
+            event = make_event('POST', {'action': 'login', 'username': 'bench_login', 'password': PASSWORD})
+            results[cost] = run(lambda: handler(event, None), args.threads, args.requests)
+        else:
+            passwords = load_module('auth', 'passwords')
+            stored = passwords.hash_password(PASSWORD)
+            results[cost] = run(lambda: passwords.verify_password(PASSWORD, stored), args.threads, args.requests)
+    print(json.dumps({'threads': args.threads, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Пропускная способность массовой регистрации.
+
+Без аргументов меряет генерацию user_code (коды в секунду, дубликаты в выборке).
+С --handler регистрирует пользователей bench_reg_* через auth action=register из
+нескольких потоков против DATABASE_URL и считает ответы по статусам.
+
+    python benchmarks/registration_throughput.py --codes 1000000
+    DATABASE_URL=postgresql://... python benchmarks/registration_throughput.py --handler --users 5000 --threads 16
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+
+from _common import load_handler, load_module, make_event, summary
+
+
+def bench_codes(count: int) -> dict:
+    user_codes = load_module('auth', 'user_codes')
+    started = time.perf_counter()
+    codes = [user_codes.generate() for _ in range(count)]
+    elapsed = time.perf_counter() - started
+    return {
+        'codes': count,
+        'codes_per_second': round(count / elapsed),
+        'duplicates': count - len(set(codes)),
+        'all_valid': all(user_codes.is_valid(code) for code in codes)
+    }
+
+
+def bench_handler(users: int, threads: int) -> dict:
+    os.environ.setdefault('SESSION_SECRET', 'bench-secret')
+    handler = load_handler('auth')
+    run_id = uuid.uuid4().hex[:8]
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    per_thread = max(1, users // threads)
+
+    def worker(index: int) -> None:
+        local, codes = [], {}
+        for n in range(per_thread):
+            name = f'bench_reg_{run_id}_{index}_{n}'
+            event = make_event('POST', {
+                'action': 'register',
+                'username': name,
+                'email': f'{name}@bench.local',
+                'emailPassword': '-',
+                'password': 'bench-password'
+            })
+            started = time.perf_counter()
+            response = handler(event, None)
+            local.append(time.perf_counter() - started)
+            codes[response['statusCode']] = codes.get(response['statusCode'], 0) + 1
+        with lock:
+            latencies.extend(local)
+            for code, count in codes.items():
+                statuses[code] = statuses.get(code, 0) + count
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return {'register': summary(latencies, time.perf_counter() - started), 'statuses': statuses}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--codes', type=int, default=200000)
+    parser.add_argument('--handler', action='store_true')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    result = bench_handler(args.users, args.threads) if args.handler else bench_codes(args.codes)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Наполняет локальный Postgres объёмами, близкими к боевым: пользователи load_user_*,
+задания load_task_*, заявки на них. Всё вставляется set-based через generate_series.
+
+    DATABASE_URL=postgresql://... python benchmarks/seed.py --users 100000 --tasks 200 --submissions 1000000
+    DATABASE_URL=postgresql://... python benchmarks/seed.py --drop
+"""
+import argparse
+import json
+import os
+import time
+
+import psycopg2
+
+from _common import load_module
+
+PASSWORD = 'load-password'
+
+
+def drop(cur) -> None:
+    # журнал append-only (V0012): удаление разрешено только явно, в пределах транзакции
+    cur.execute("SET LOCAL ledger.allow_purge = 'on'")
+    for table in ('balance_snapshots', 'ledger_drift', 'user_versions', 'moderation_outbox'):
+        cur.execute(f"DELETE FROM {table} WHERE user_id IN (SELECT id FROM users WHERE username LIKE 'load_user_%')")
+    cur.execute("""
+        DELETE FROM moderation_outbox
+        WHERE submission_id IN (
+            SELECT ts.id FROM task_submissions ts JOIN tasks t ON t.id = ts.task_id WHERE t.title LIKE 'load_task_%'
+        )
+    """)
+    cur.execute("""
+        DELETE FROM transactions
+        WHERE user_id IN (SELECT id FROM users WHERE username LIKE 'load_user_%')
+           OR task_submission_id IN (
+               SELECT ts.id FROM task_submissions ts JOIN tasks t ON t.id = ts.task_id WHERE t.title LIKE 'load_task_%'
+           )
+    """)
+    cur.execute("""
+        DELETE FROM task_submissions
+        WHERE user_id IN (SELECT id FROM users WHERE username LIKE 'load_user_%')
+           OR task_id IN (SELECT id FROM tasks WHERE title LIKE 'load_task_%')
+    """)
+    for table in ('task_review_buckets', 'task_stats'):
+        cur.execute(f"DELETE FROM {table} WHERE task_id IN (SELECT id FROM tasks WHERE title LIKE 'load_task_%')")
+    cur.execute("DELETE FROM tasks WHERE title LIKE 'load_task_%'")
+    cur.execute("DELETE FROM users WHERE username LIKE 'load_user_%'")
+
+
+def seed(cur, users: int, tasks: int, submissions: int) -> dict:
+    timings = {}
+    password_hash = load_module('auth', 'passwords').hash_password(PASSWORD)
+
+    started = time.perf_counter()
+    cur.execute("""
+        INSERT INTO users (username, email, email_password, password_hash, user_code, balance, level, completed_tasks, is_blocked)
+        SELECT 'load_user_' || n, 'load_user_' || n || '@load.local', '-', %s,
+               lpad((66000000000000000000::numeric + n)::text, 20, '0'),
+               round((random() * 10000)::numeric, 2), 1 + n %% 20, (n %% 20) * 5, n %% 97 = 0
+        FROM generate_series(1, %s) AS n
+    """, (password_hash, users))
+    timings['users_s'] = round(time.perf_counter() - started, 2)
+
+    started = time.perf_counter()
+    cur.execute("""
+        INSERT INTO tasks (title, description, reward, difficulty, is_published, created_by)
+        SELECT 'load_task_' || n, 'Нагрузочное задание ' || n, 10 + n %% 90,
+               (ARRAY['easy', 'medium', 'hard'])[1 + n %% 3], n %% 10 <> 0,
+               (SELECT id FROM users WHERE is_admin = TRUE ORDER BY id LIMIT 1)
+        FROM generate_series(1, %s) AS n
+    """, (tasks,))
+    timings['tasks_s'] = round(time.perf_counter() - started, 2)
+
+    # пары (задание, пользователь) различны, пока submissions <= tasks * users: у каждого задания
+    # свой сдвиг по пользователям. Активная заявка на пару одна (V0008), лишние при переполнении пропускаются
+    started = time.perf_counter()
+    cur.execute("""
+        WITH u AS (SELECT array_agg(id) AS ids FROM users WHERE username LIKE 'load_user_%%'),
+             t AS (SELECT array_agg(id) AS ids FROM tasks WHERE title LIKE 'load_task_%%')
+        INSERT INTO task_submissions (task_id, user_id, screenshot_url, link_url, status, submitted_at, reviewed_at)
+        SELECT t.ids[1 + (n - 1) %% array_length(t.ids, 1)],
+               u.ids[1 + ((n - 1) / array_length(t.ids, 1) + (n - 1) %% array_length(t.ids, 1) * 7919)
+                         %% array_length(u.ids, 1)],
+               'https://example.com/s/' || n || '.png', 'https://example.com/l/' || n,
+               CASE WHEN n %% 10 < 2 THEN 'pending' WHEN n %% 10 < 9 THEN 'approved' ELSE 'rejected' END,
+               CURRENT_TIMESTAMP - (n || ' seconds')::interval,
+               CASE WHEN n %% 10 >= 2 THEN CURRENT_TIMESTAMP - (n || ' seconds')::interval + interval '1 hour' END
+        FROM generate_series(1, %s) AS n, u, t
+        ON CONFLICT (task_id, user_id) WHERE status IN ('pending', 'approved') DO NOTHING
+    """, (submissions,))
+    timings['submissions_s'] = round(time.perf_counter() - started, 2)
+
+    cur.execute("ANALYZE users")
+    cur.execute("ANALYZE tasks")
+    cur.execute("ANALYZE task_submissions")
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--tasks', type=int, default=200)
+    parser.add_argument('--submissions', type=int, default=1000000)
+    parser.add_argument('--drop', action='store_true', help='только удалить ранее засеянные данные')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    drop(cur)
+    conn.commit()
+    result = {'dropped': True}
+    if not args.drop:
+        result = seed(cur, args.users, args.tasks, args.submissions)
+        conn.commit()
+    conn.close()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Конкурентный бенчмарк переводов users POST action=transfer.
+
+Создаёт пользователей bench_xfer_*, гоняет переводы из нескольких потоков с перекосом
+в сторону «горячих» счетов и повторами с тем же ключом идемпотентности, затем проверяет,
+что сумма балансов не изменилась, каждый баланс сходится с журналом send/receive
+и ни один запрос не завершился 5xx (например, взаимоблокировкой).
+
+    DATABASE_URL=postgresql://... python benchmarks/transfers_concurrency.py --users 200 --threads 16 --transfers 5000
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+import psycopg2
+
+from _common import load_handler, load_module, make_event, summary
+
+INITIAL_BALANCE = Decimal('1000.00')
+
+
+def seed(conn, count: int) -> list:
+    cur = conn.cursor()
+    cur.execute("SET LOCAL ledger.allow_purge = 'on'")
+    for table in ('balance_snapshots', 'ledger_drift', 'user_versions'):
+        cur.execute(f"DELETE FROM {table} WHERE user_id IN (SELECT id FROM users WHERE username LIKE 'bench_xfer_%')")
+    cur.execute("""
+        DELETE FROM transactions WHERE user_id IN (SELECT id FROM users WHERE username LIKE 'bench_xfer_%')
+    """)
+    cur.execute("DELETE FROM transfers WHERE from_user_id IN (SELECT id FROM users WHERE username LIKE 'bench_xfer_%')")
+    cur.execute("DELETE FROM users WHERE username LIKE 'bench_xfer_%'")
+    cur.execute("""
+        INSERT INTO users (username, email, email_password, password_hash, user_code, balance)
+        SELECT 'bench_xfer_' || n, 'bench_xfer_' || n || '@bench.local', '-', '-',
+               lpad((88000000000000000000::numeric + n)::text, 20, '0'), %s
+        FROM generate_series(1, %s) AS n
+        RETURNING id
+    """, (INITIAL_BALANCE, count))
+    ids = sorted(row[0] for row in cur.fetchall())
+    conn.commit()
+    return ids
+
+
+def verify(conn, ids: list) -> list:
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT u.id, u.balance,
+               COALESCE(SUM(CASE WHEN t.type = 'receive' THEN t.amount WHEN t.type = 'send' THEN -t.amount END), 0)
+        FROM users u
+        LEFT JOIN transactions t ON t.user_id = u.id AND t.type IN ('send', 'receive')
+        WHERE u.id = ANY(%s)
+        GROUP BY u.id, u.balance
+    """, (ids,))
+    problems = []
+    total = Decimal('0')
+    for user_id, balance, ledger_delta in cur.fetchall():
+        total += balance
+        if balance != INITIAL_BALANCE + ledger_delta:
+            problems.append(f'user {user_id}: balance {balance} != ledger {INITIAL_BALANCE + ledger_delta}')
+        if balance < 0:
+            problems.append(f'user {user_id}: negative balance {balance}')
+    if total != INITIAL_BALANCE * len(ids):
+        problems.append(f'total supply {total} != {INITIAL_BALANCE * len(ids)}')
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--hot', type=int, default=5, help='число «горячих» счетов')
+    parser.add_argument('--hot-share', type=float, default=0.8, help='доля переводов с участием горячих счетов')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--transfers', type=int, default=5000)
+    parser.add_argument('--retry-share', type=float, default=0.1, help='доля переводов, повторяемых с тем же ключом')
+    args = parser.parse_args()
+
+    os.environ.setdefault('SESSION_SECRET', 'bench-secret')
+    os.environ.setdefault('LOG_REQUESTS', '0')
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    ids = seed(conn, args.users)
+    hot = ids[:args.hot]
+    tokens = load_module('users', 'tokens')
+    sessions = {user_id: tokens.issue(user_id, False) for user_id in ids}
+    handler = load_handler('users')
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    per_thread = args.transfers // args.threads
+
+    def worker(seed_value: int) -> None:
+        rnd = random.Random(seed_value)
+        local, codes = [], {}
+        for _ in range(per_thread):
+            if rnd.random() < args.hot_share:
+                a, b = rnd.choice(hot), rnd.choice(ids)
+            else:
+                a, b = rnd.sample(ids, 2)
+            if a == b:
+                continue
+            body = {
+                'action': 'transfer',
+                'to_user_id': b,
+                'amount': str(Decimal(rnd.randint(1, 5000)) / 100),
+                'idempotency_key': uuid.uuid4().hex
+            }
+            for _ in range(2 if rnd.random() < args.retry_share else 1):
+                started = time.perf_counter()
+                response = handler(make_event('POST', body, headers={'X-Auth-Token': sessions[a]}), None)
+                local.append(time.perf_counter() - started)
+                codes[response['statusCode']] = codes.get(response['statusCode'], 0) + 1
+        with lock:
+            latencies.extend(local)
+            for code, count in codes.items():
+                statuses[code] = statuses.get(code, 0) + count
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    problems = verify(conn, ids)
+    failed = sum(count for code, count in statuses.items() if code >= 500)
+    if failed:
+        problems.insert(0, f'{failed} responses with 5xx status')
+    if not statuses.get(200):
+        problems.insert(0, 'no transfer succeeded')
+    print(json.dumps({'transfer': summary(latencies, elapsed), 'statuses': statuses, 'problems': problems[:20]}, indent=2))
+    conn.close()
+    if problems:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+-- Keyset-пагинация списка пользователей по (balance, id) требует NOT NULL баланса
+UPDATE users SET balance = 0 WHERE balance IS NULL;
+ALTER TABLE users ALTER COLUMN balance SET NOT NULL;
+
+-- Основной порядок списка: баланс по убыванию, id как tie-breaker
+CREATE INDEX IF NOT EXISTS idx_users_balance_id
+    ON users (balance DESC, id DESC) WHERE is_admin = FALSE;
+
+-- Фильтр по статусу блокировки с тем же порядком страниц
+CREATE INDEX IF NOT EXISTS idx_users_blocked_balance_id
+    ON users (is_blocked, balance DESC, id DESC) WHERE is_admin = FALSE;
+
+-- Фильтр по диапазону уровней
+CREATE INDEX IF NOT EXISTS idx_users_level_balance_id
+    ON users (level, balance DESC, id DESC) WHERE is_admin = FALSE;
+
+-- Поиск по префиксу имени (LIKE 'abc%')
+CREATE INDEX IF NOT EXISTS idx_users_username_prefix
+    ON users (username varchar_pattern_ops) WHERE is_admin = FALSE;
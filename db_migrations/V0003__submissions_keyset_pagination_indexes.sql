@@ -0,0 +1,12 @@
+-- Очередь модерации: страницы по (submitted_at, id) внутри статуса и подсчёт по статусу
+CREATE INDEX IF NOT EXISTS idx_task_submissions_status_submitted
+    ON task_submissions (status, submitted_at DESC, id DESC);
+
+-- Фильтры очереди по заданию и по пользователю
+CREATE INDEX IF NOT EXISTS idx_task_submissions_task_status_submitted
+    ON task_submissions (task_id, status, submitted_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_task_submissions_user_status_submitted
+    ON task_submissions (user_id, status, submitted_at DESC, id DESC);
+
+-- Одиночный индекс по статусу покрыт составным
+DROP INDEX IF EXISTS idx_task_submissions_status;
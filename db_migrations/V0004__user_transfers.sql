@@ -0,0 +1,13 @@
+-- Переводы между пользователями с ключом идемпотентности для безопасных повторов
+CREATE TABLE IF NOT EXISTS transfers (
+    id SERIAL PRIMARY KEY,
+    idempotency_key VARCHAR(64) UNIQUE,
+    from_user_id INTEGER NOT NULL REFERENCES users(id),
+    to_user_id INTEGER NOT NULL REFERENCES users(id),
+    amount DECIMAL(15, 2) NOT NULL CHECK (amount > 0),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Парные записи send/receive в журнале ссылаются на перевод
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS transfer_id INTEGER REFERENCES transfers(id);
+CREATE INDEX IF NOT EXISTS idx_transactions_transfer_id ON transactions(transfer_id);
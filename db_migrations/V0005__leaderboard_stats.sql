@@ -0,0 +1,82 @@
+-- Агрегаты по платформе: общий баланс, число пользователей, выполненные задания
+CREATE TABLE IF NOT EXISTS platform_stats (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    total_supply DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    users_count INTEGER NOT NULL DEFAULT 0,
+    tasks_completed BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Число пользователей на каждом уровне
+CREATE TABLE IF NOT EXISTS level_stats (
+    level INTEGER PRIMARY KEY,
+    users_count INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO platform_stats (id, total_supply, users_count, tasks_completed)
+SELECT TRUE, COALESCE(SUM(balance), 0), COUNT(*), COALESCE(SUM(completed_tasks), 0)
+FROM users
+WHERE is_admin = FALSE
+ON CONFLICT (id) DO NOTHING;
+
+INSERT INTO level_stats (level, users_count)
+SELECT COALESCE(level, 1), COUNT(*)
+FROM users
+WHERE is_admin = FALSE
+GROUP BY COALESCE(level, 1)
+ON CONFLICT (level) DO NOTHING;
+
+-- Инкрементальное обновление агрегатов: одна дельта на оператор по transition-таблицам.
+-- Переводы между пользователями дают нулевую дельту и не трогают строку platform_stats.
+CREATE OR REPLACE FUNCTION apply_user_stats_delta() RETURNS TRIGGER AS $$
+DECLARE
+    source TEXT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        source := 'SELECT 1 AS sign, * FROM new_rows';
+    ELSIF TG_OP = 'DELETE' THEN
+        source := 'SELECT -1 AS sign, * FROM old_rows';
+    ELSE
+        source := 'SELECT 1 AS sign, * FROM new_rows UNION ALL SELECT -1 AS sign, * FROM old_rows';
+    END IF;
+
+    EXECUTE format($sql$
+        WITH delta AS (
+            SELECT sign, balance, COALESCE(completed_tasks, 0) AS completed_tasks, COALESCE(level, 1) AS level
+            FROM (%s) AS changed
+            WHERE is_admin IS NOT TRUE
+        ), levels AS (
+            INSERT INTO level_stats (level, users_count)
+            SELECT level, SUM(sign) FROM delta GROUP BY level HAVING SUM(sign) <> 0
+            ON CONFLICT (level) DO UPDATE SET users_count = level_stats.users_count + EXCLUDED.users_count
+        )
+        UPDATE platform_stats
+        SET total_supply = total_supply + totals.balance,
+            users_count = users_count + totals.users,
+            tasks_completed = tasks_completed + totals.completed_tasks,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT SUM(sign * balance) AS balance, SUM(sign) AS users, SUM(sign * completed_tasks) AS completed_tasks
+            FROM delta
+        ) AS totals
+        WHERE totals.balance <> 0 OR totals.users <> 0 OR totals.completed_tasks <> 0
+    $sql$, source);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_stats_insert ON users;
+CREATE TRIGGER users_stats_insert AFTER INSERT ON users
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_user_stats_delta();
+
+DROP TRIGGER IF EXISTS users_stats_update ON users;
+CREATE TRIGGER users_stats_update AFTER UPDATE ON users
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_user_stats_delta();
+
+DROP TRIGGER IF EXISTS users_stats_delete ON users;
+CREATE TRIGGER users_stats_delete AFTER DELETE ON users
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_user_stats_delta();
@@ -0,0 +1,21 @@
+-- Тип 'reset' в журнале: списание остатка при сезонном обнулении балансов
+ALTER TABLE transactions DROP CONSTRAINT IF EXISTS transactions_type_check;
+ALTER TABLE transactions ADD CONSTRAINT transactions_type_check
+    CHECK (type IN ('send', 'receive', 'task', 'admin', 'reset'));
+
+-- Прогресс обнуления балансов: батчи по id, можно продолжить после обрыва
+CREATE TABLE IF NOT EXISTS balance_resets (
+    id SERIAL PRIMARY KEY,
+    total_users INTEGER NOT NULL DEFAULT 0,
+    users_scanned INTEGER NOT NULL DEFAULT 0,
+    users_reset INTEGER NOT NULL DEFAULT 0,
+    total_amount DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    last_user_id INTEGER NOT NULL DEFAULT 0,
+    started_by INTEGER REFERENCES users(id),
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- Одновременно может идти только одно обнуление
+CREATE UNIQUE INDEX IF NOT EXISTS idx_balance_resets_active
+    ON balance_resets ((finished_at IS NULL)) WHERE finished_at IS NULL;
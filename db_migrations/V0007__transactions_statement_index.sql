@@ -0,0 +1,6 @@
+-- Выписка пользователя: страницы по (created_at, id) внутри user_id
+CREATE INDEX IF NOT EXISTS idx_transactions_user_created
+    ON transactions (user_id, created_at DESC, id DESC);
+
+-- Одиночный индекс по user_id покрыт составным
+DROP INDEX IF EXISTS idx_transactions_user_id;
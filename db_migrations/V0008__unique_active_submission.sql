@@ -0,0 +1,18 @@
+-- Повторные pending-заявки на то же задание от того же пользователя отклоняем,
+-- оставляя одобренную или самую раннюю. Дубли среди уже одобренных (двойные выплаты)
+-- нужно разобрать вручную до применения миграции.
+UPDATE task_submissions ts
+SET status = 'rejected', reviewed_at = CURRENT_TIMESTAMP, admin_comment = 'Дубликат заявки'
+FROM (
+    SELECT id, ROW_NUMBER() OVER (
+        PARTITION BY task_id, user_id
+        ORDER BY (status = 'approved') DESC, submitted_at, id
+    ) AS position
+    FROM task_submissions
+    WHERE status IN ('pending', 'approved')
+) ranked
+WHERE ts.id = ranked.id AND ranked.position > 1 AND ts.status = 'pending';
+
+-- Не больше одной активной (pending/approved) заявки на пару задание-пользователь
+CREATE UNIQUE INDEX IF NOT EXISTS idx_task_submissions_active_unique
+    ON task_submissions (task_id, user_id) WHERE status IN ('pending', 'approved');
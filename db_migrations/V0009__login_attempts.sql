@@ -0,0 +1,11 @@
+-- Общий счётчик неудачных входов для нескольких экземпляров auth (LOGIN_LIMIT_SHARED=1):
+-- ключ 'user:<имя>' или 'ip:<адрес>', номер окна = unix-время // LOGIN_WINDOW
+CREATE TABLE IF NOT EXISTS login_attempts (
+    key VARCHAR(300) NOT NULL,
+    window_index BIGINT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (key, window_index)
+);
+
+-- Для периодической очистки старых окон
+CREATE INDEX IF NOT EXISTS idx_login_attempts_window ON login_attempts (window_index);
@@ -0,0 +1,54 @@
+-- Версия состояния пользователя для action=me: растёт при любом изменении профиля,
+-- его заявок или журнала. Отдельная таблица, чтобы не трогать строки users
+-- (и триггеры агрегатов на них) ради одного счётчика.
+CREATE TABLE IF NOT EXISTS user_versions (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id),
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+-- Заявки и журнал: одно увеличение на пользователя за оператор
+CREATE OR REPLACE FUNCTION bump_user_versions() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO user_versions (user_id, version)
+    SELECT DISTINCT user_id, 1 FROM new_rows WHERE user_id IS NOT NULL
+    ON CONFLICT (user_id) DO UPDATE SET version = user_versions.version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Профиль: только если изменились поля, которые видит пользователь
+CREATE OR REPLACE FUNCTION bump_user_versions_on_profile() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO user_versions (user_id, version)
+    SELECT n.id, 1
+    FROM new_rows n
+    JOIN old_rows o ON o.id = n.id
+    WHERE (n.username, n.email, n.balance, n.level, n.completed_tasks, n.is_blocked)
+        IS DISTINCT FROM (o.username, o.email, o.balance, o.level, o.completed_tasks, o.is_blocked)
+    ON CONFLICT (user_id) DO UPDATE SET version = user_versions.version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_version_update ON users;
+CREATE TRIGGER users_version_update AFTER UPDATE ON users
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_user_versions_on_profile();
+
+DROP TRIGGER IF EXISTS task_submissions_version_insert ON task_submissions;
+CREATE TRIGGER task_submissions_version_insert AFTER INSERT ON task_submissions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_user_versions();
+
+DROP TRIGGER IF EXISTS task_submissions_version_update ON task_submissions;
+CREATE TRIGGER task_submissions_version_update AFTER UPDATE ON task_submissions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_user_versions();
+
+DROP TRIGGER IF EXISTS transactions_version_insert ON transactions;
+CREATE TRIGGER transactions_version_insert AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_user_versions();
+
+-- Новые записи журнала пользователя после курсора (id)
+CREATE INDEX IF NOT EXISTS idx_transactions_user_id_id ON transactions (user_id, id);
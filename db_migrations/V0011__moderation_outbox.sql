@@ -0,0 +1,22 @@
+-- Outbox модерации: одобрение пишет событие в той же транзакции, начисление делает воркер.
+-- processed_at ставится в транзакции начисления, поэтому событие применяется ровно один раз.
+CREATE TABLE IF NOT EXISTS moderation_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    event_type VARCHAR(40) NOT NULL,
+    submission_id INTEGER NOT NULL REFERENCES task_submissions(id),
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    amount DECIMAL(15, 2) NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    available_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    processed_at TIMESTAMP
+);
+
+-- Одно событие каждого типа на заявку
+CREATE UNIQUE INDEX IF NOT EXISTS idx_moderation_outbox_event_submission
+    ON moderation_outbox (event_type, submission_id);
+
+-- Очередь воркера: только необработанные
+CREATE INDEX IF NOT EXISTS idx_moderation_outbox_pending
+    ON moderation_outbox (id) WHERE processed_at IS NULL;
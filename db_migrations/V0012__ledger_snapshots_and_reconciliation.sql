@@ -0,0 +1,56 @@
+-- Журнал transactions — источник истины для балансов: только добавление.
+-- Удаление разрешено лишь явно в рамках транзакции (SET LOCAL ledger.allow_purge = 'on'),
+-- например для очистки нагрузочных данных.
+CREATE OR REPLACE FUNCTION forbid_ledger_changes() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'TRUNCATE') AND current_setting('ledger.allow_purge', TRUE) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    RAISE EXCEPTION 'transactions is append-only, % is not allowed', TG_OP;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS transactions_append_only ON transactions;
+CREATE TRIGGER transactions_append_only BEFORE UPDATE OR DELETE OR TRUNCATE ON transactions
+    FOR EACH STATEMENT EXECUTE FUNCTION forbid_ledger_changes();
+
+-- Снимки баланса: balance = сумма журнала пользователя по запись ledger_id включительно
+CREATE TABLE IF NOT EXISTS balance_snapshots (
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    ledger_id INTEGER NOT NULL,
+    balance DECIMAL(15, 2) NOT NULL,
+    taken_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, ledger_id)
+);
+
+-- Точка отсчёта: текущие балансы считаются верными на момент миграции
+INSERT INTO balance_snapshots (user_id, ledger_id, balance)
+SELECT u.id, (SELECT COALESCE(MAX(id), 0) FROM transactions), u.balance
+FROM users u
+ON CONFLICT DO NOTHING;
+
+-- Прогоны сверки: батчи по id пользователя, можно продолжить после обрыва.
+-- horizon_id — последняя запись журнала, которую прогон переносит в снимки
+CREATE TABLE IF NOT EXISTS reconciliation_runs (
+    id SERIAL PRIMARY KEY,
+    horizon_id INTEGER NOT NULL,
+    last_user_id INTEGER NOT NULL DEFAULT 0,
+    users_checked INTEGER NOT NULL DEFAULT 0,
+    users_drifted INTEGER NOT NULL DEFAULT 0,
+    snapshots_taken INTEGER NOT NULL DEFAULT 0,
+    started_by INTEGER REFERENCES users(id),
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_reconciliation_runs_active
+    ON reconciliation_runs ((finished_at IS NULL)) WHERE finished_at IS NULL;
+
+-- Расхождения: ожидаемый по журналу баланс против users.balance
+CREATE TABLE IF NOT EXISTS ledger_drift (
+    run_id INTEGER NOT NULL REFERENCES reconciliation_runs(id),
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    expected DECIMAL(15, 2) NOT NULL,
+    actual DECIMAL(15, 2) NOT NULL,
+    PRIMARY KEY (run_id, user_id)
+);
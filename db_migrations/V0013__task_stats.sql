@@ -0,0 +1,152 @@
+-- Счётчики по заданиям для админки: заявки по статусам и выплаченные награды.
+-- Ведутся триггерами по transition-таблицам, как platform_stats (V0005), так что их
+-- обновляют все пути записи: submit, approve через outbox, reject и bulk_review
+CREATE TABLE IF NOT EXISTS task_stats (
+    task_id INTEGER PRIMARY KEY REFERENCES tasks(id),
+    pending INTEGER NOT NULL DEFAULT 0,
+    approved INTEGER NOT NULL DEFAULT 0,
+    rejected INTEGER NOT NULL DEFAULT 0,
+    total_paid DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Гистограмма времени проверки (reviewed_at - submitted_at) для медианы:
+-- корзина b покрывает [2^(b/4), 2^((b+1)/4)) секунд, четыре корзины на удвоение
+CREATE TABLE IF NOT EXISTS task_review_buckets (
+    task_id INTEGER NOT NULL REFERENCES tasks(id),
+    bucket SMALLINT NOT NULL,
+    submissions INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (task_id, bucket)
+);
+
+CREATE OR REPLACE FUNCTION review_time_bucket(submitted_at TIMESTAMP, reviewed_at TIMESTAMP) RETURNS SMALLINT AS $$
+    SELECT LEAST(FLOOR(4 * LN(GREATEST(EXTRACT(EPOCH FROM reviewed_at - submitted_at), 1)) / LN(2)), 127)::SMALLINT
+$$ LANGUAGE sql IMMUTABLE;
+
+INSERT INTO task_stats (task_id, pending, approved, rejected)
+SELECT task_id,
+       COUNT(*) FILTER (WHERE status = 'pending'),
+       COUNT(*) FILTER (WHERE status = 'approved'),
+       COUNT(*) FILTER (WHERE status = 'rejected')
+FROM task_submissions
+GROUP BY task_id
+ON CONFLICT (task_id) DO NOTHING;
+
+INSERT INTO task_stats (task_id, total_paid)
+SELECT ts.task_id, SUM(t.amount)
+FROM transactions t
+JOIN task_submissions ts ON ts.id = t.task_submission_id
+WHERE t.type = 'task'
+GROUP BY ts.task_id
+ON CONFLICT (task_id) DO UPDATE SET total_paid = EXCLUDED.total_paid;
+
+INSERT INTO task_review_buckets (task_id, bucket, submissions)
+SELECT task_id, review_time_bucket(submitted_at, reviewed_at), COUNT(*)
+FROM task_submissions
+WHERE status <> 'pending' AND reviewed_at IS NOT NULL
+GROUP BY 1, 2
+ON CONFLICT (task_id, bucket) DO NOTHING;
+
+-- Заявки: дельта статусов и корзин на оператор. Строки обновляются в порядке task_id,
+-- чтобы параллельные bulk_review по разным наборам заданий не ловили взаимоблокировку
+CREATE OR REPLACE FUNCTION apply_task_submission_stats_delta() RETURNS TRIGGER AS $$
+DECLARE
+    source TEXT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        source := 'SELECT 1 AS sign, * FROM new_rows';
+    ELSIF TG_OP = 'DELETE' THEN
+        source := 'SELECT -1 AS sign, * FROM old_rows';
+    ELSE
+        source := 'SELECT 1 AS sign, * FROM new_rows UNION ALL SELECT -1 AS sign, * FROM old_rows';
+    END IF;
+
+    EXECUTE format($sql$
+        WITH delta AS (
+            SELECT sign, task_id, status, submitted_at, reviewed_at
+            FROM (%s) AS changed
+        ), buckets AS (
+            INSERT INTO task_review_buckets (task_id, bucket, submissions)
+            SELECT task_id, review_time_bucket(submitted_at, reviewed_at), SUM(sign)
+            FROM delta
+            WHERE status <> 'pending' AND reviewed_at IS NOT NULL
+            GROUP BY 1, 2
+            HAVING SUM(sign) <> 0
+            ORDER BY 1, 2
+            ON CONFLICT (task_id, bucket) DO UPDATE
+                SET submissions = task_review_buckets.submissions + EXCLUDED.submissions
+        )
+        INSERT INTO task_stats (task_id, pending, approved, rejected)
+        SELECT task_id,
+               COALESCE(SUM(sign) FILTER (WHERE status = 'pending'), 0),
+               COALESCE(SUM(sign) FILTER (WHERE status = 'approved'), 0),
+               COALESCE(SUM(sign) FILTER (WHERE status = 'rejected'), 0)
+        FROM delta
+        GROUP BY task_id
+        HAVING SUM(sign) FILTER (WHERE status = 'pending') <> 0
+            OR SUM(sign) FILTER (WHERE status = 'approved') <> 0
+            OR SUM(sign) FILTER (WHERE status = 'rejected') <> 0
+        ORDER BY task_id
+        ON CONFLICT (task_id) DO UPDATE
+            SET pending = task_stats.pending + EXCLUDED.pending,
+                approved = task_stats.approved + EXCLUDED.approved,
+                rejected = task_stats.rejected + EXCLUDED.rejected,
+                updated_at = CURRENT_TIMESTAMP
+    $sql$, source);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS task_submissions_stats_insert ON task_submissions;
+CREATE TRIGGER task_submissions_stats_insert AFTER INSERT ON task_submissions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_task_submission_stats_delta();
+
+DROP TRIGGER IF EXISTS task_submissions_stats_update ON task_submissions;
+CREATE TRIGGER task_submissions_stats_update AFTER UPDATE ON task_submissions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_task_submission_stats_delta();
+
+DROP TRIGGER IF EXISTS task_submissions_stats_delete ON task_submissions;
+CREATE TRIGGER task_submissions_stats_delete AFTER DELETE ON task_submissions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_task_submission_stats_delta();
+
+-- Выплаты: награды попадают в журнал при начислении (outbox или bulk_review), не при смене статуса
+CREATE OR REPLACE FUNCTION apply_task_paid_delta() RETURNS TRIGGER AS $$
+DECLARE
+    source TEXT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        source := 'SELECT 1 AS sign, * FROM new_rows';
+    ELSE
+        source := 'SELECT -1 AS sign, * FROM old_rows';
+    END IF;
+
+    EXECUTE format($sql$
+        INSERT INTO task_stats (task_id, total_paid)
+        SELECT ts.task_id, SUM(changed.sign * changed.amount)
+        FROM (%s) AS changed
+        JOIN task_submissions ts ON ts.id = changed.task_submission_id
+        WHERE changed.type = 'task'
+        GROUP BY ts.task_id
+        ORDER BY ts.task_id
+        ON CONFLICT (task_id) DO UPDATE
+            SET total_paid = task_stats.total_paid + EXCLUDED.total_paid,
+                updated_at = CURRENT_TIMESTAMP
+    $sql$, source);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS transactions_task_paid_insert ON transactions;
+CREATE TRIGGER transactions_task_paid_insert AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_task_paid_delta();
+
+DROP TRIGGER IF EXISTS transactions_task_paid_delete ON transactions;
+CREATE TRIGGER transactions_task_paid_delete AFTER DELETE ON transactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_task_paid_delta();
@@ -0,0 +1,77 @@
+-- Агрегаты платформы разбиты на 16 строк-шардов: транзакция пишет дельту в шард txid % 16,
+-- чтение суммирует шарды. Раньше каждая регистрация, начисление и пакет сброса обновляли
+-- одну строку platform_stats и держали её блокировку до коммита — все изменения балансов
+-- на платформе шли по очереди через неё
+LOCK TABLE platform_stats, level_stats IN EXCLUSIVE MODE;
+
+CREATE TABLE IF NOT EXISTS platform_stats_shards (
+    shard SMALLINT PRIMARY KEY,
+    total_supply DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    users_count INTEGER NOT NULL DEFAULT 0,
+    tasks_completed BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS level_stats_shards (
+    level INTEGER NOT NULL,
+    shard SMALLINT NOT NULL,
+    users_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (level, shard)
+);
+
+-- Накопленные значения переезжают в шард 0
+INSERT INTO platform_stats_shards (shard, total_supply, users_count, tasks_completed, updated_at)
+SELECT 0, total_supply, users_count, tasks_completed, updated_at
+FROM platform_stats
+ON CONFLICT (shard) DO NOTHING;
+
+INSERT INTO level_stats_shards (level, shard, users_count)
+SELECT level, 0, users_count
+FROM level_stats
+ON CONFLICT (level, shard) DO NOTHING;
+
+-- Те же дельты, что в V0005, но в шард текущей транзакции. Уровни обновляются по порядку,
+-- чтобы транзакции, попавшие в один шард, не блокировали друг друга встречно
+CREATE OR REPLACE FUNCTION apply_user_stats_delta() RETURNS TRIGGER AS $$
+DECLARE
+    source TEXT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        source := 'SELECT 1 AS sign, * FROM new_rows';
+    ELSIF TG_OP = 'DELETE' THEN
+        source := 'SELECT -1 AS sign, * FROM old_rows';
+    ELSE
+        source := 'SELECT 1 AS sign, * FROM new_rows UNION ALL SELECT -1 AS sign, * FROM old_rows';
+    END IF;
+
+    EXECUTE format($sql$
+        WITH delta AS (
+            SELECT sign, balance, COALESCE(completed_tasks, 0) AS completed_tasks, COALESCE(level, 1) AS level
+            FROM (%s) AS changed
+            WHERE is_admin IS NOT TRUE
+        ), levels AS (
+            INSERT INTO level_stats_shards (level, shard, users_count)
+            SELECT level, txid_current() %% 16, SUM(sign) FROM delta GROUP BY level HAVING SUM(sign) <> 0
+            ORDER BY level
+            ON CONFLICT (level, shard) DO UPDATE SET users_count = level_stats_shards.users_count + EXCLUDED.users_count
+        )
+        INSERT INTO platform_stats_shards (shard, total_supply, users_count, tasks_completed)
+        SELECT txid_current() %% 16, totals.balance, totals.users, totals.completed_tasks
+        FROM (
+            SELECT SUM(sign * balance) AS balance, SUM(sign) AS users, SUM(sign * completed_tasks) AS completed_tasks
+            FROM delta
+        ) AS totals
+        WHERE totals.balance <> 0 OR totals.users <> 0 OR totals.completed_tasks <> 0
+        ON CONFLICT (shard) DO UPDATE
+            SET total_supply = platform_stats_shards.total_supply + EXCLUDED.total_supply,
+                users_count = platform_stats_shards.users_count + EXCLUDED.users_count,
+                tasks_completed = platform_stats_shards.tasks_completed + EXCLUDED.tasks_completed,
+                updated_at = CURRENT_TIMESTAMP
+    $sql$, source);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TABLE platform_stats;
+DROP TABLE level_stats;
@@ -5,6 +5,15 @@ const API_BASE = {
   users: 'https://functions.poehali.dev/4e01cb8d-34a9-4f04-9af3-d560e46b6579',
 };
 
+let sessionToken: string | null = null;
+
+const authHeaders = (): Record<string, string> => (sessionToken ? { 'X-Auth-Token': sessionToken } : {});
+
+const rememberToken = (data: any) => {
+  if (data.token) sessionToken = data.token;
+  return data;
+};
+
 export const api = {
   auth: {
     register: async (data: { username: string; email: string; emailPassword: string; password: string }) => {
@@ -13,7 +22,7 @@ export const api = {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ action: 'register', ...data }),
       });
-      return response.json();
+      return rememberToken(await response.json());
     },
     login: async (data: { username: string; password: string }) => {
       const response = await fetch(API_BASE.auth, {
@@ -21,7 +30,7 @@ export const api = {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ action: 'login', ...data }),
       });
-      return response.json();
+      return rememberToken(await response.json());
     },
   },
   tasks: {
@@ -30,13 +39,17 @@ export const api = {
       return response.json();
     },
     adminList: async () => {
-      const response = await fetch(`${API_BASE.tasks}?action=admin_list`);
+      const response = await fetch(`${API_BASE.tasks}?action=admin_list`, { headers: authHeaders() });
+      return response.json();
+    },
+    stats: async () => {
+      const response = await fetch(`${API_BASE.tasks}?action=stats`, { headers: authHeaders() });
       return response.json();
     },
     create: async (data: { title: string; description: string; reward: number; difficulty: string; created_by: number }) => {
       const response = await fetch(API_BASE.tasks, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...authHeaders() },
         body: JSON.stringify({ action: 'create', ...data }),
       });
       return response.json();
@@ -44,7 +57,7 @@ export const api = {
     publish: async (task_id: number) => {
       const response = await fetch(API_BASE.tasks, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...authHeaders() },
         body: JSON.stringify({ action: 'publish', task_id }),
       });
       return response.json();
@@ -52,7 +65,7 @@ export const api = {
     submit: async (data: { task_id: number; user_id: number; screenshot_url: string; link_url: string }) => {
       const response = await fetch(API_BASE.tasks, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...authHeaders() },
         body: JSON.stringify({ action: 'submit', ...data }),
       });
       return response.json();
@@ -60,7 +73,7 @@ export const api = {
     approve: async (data: { submission_id: number; admin_id: number }) => {
       const response = await fetch(API_BASE.tasks, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...authHeaders() },
         body: JSON.stringify({ action: 'approve', ...data }),
       });
       return response.json();
@@ -68,27 +81,69 @@ export const api = {
     reject: async (data: { submission_id: number; admin_id: number; comment: string }) => {
       const response = await fetch(API_BASE.tasks, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...authHeaders() },
         body: JSON.stringify({ action: 'reject', ...data }),
       });
       return response.json();
     },
+    bulkReview: async (data: { submission_ids: number[]; decision: 'approve' | 'reject'; admin_id: number; comment?: string }) => {
+      const response = await fetch(API_BASE.tasks, {
+        method: 'PUT',
+        headers: { 'Content-Type': 'application/json', ...authHeaders() },
+        body: JSON.stringify({ action: 'bulk_review', ...data }),
+      });
+      return response.json();
+    },
   },
   submissions: {
-    list: async (status: string = 'pending') => {
-      const response = await fetch(`${API_BASE.submissions}?status=${status}`);
+    list: async (status: string = 'pending', params: { limit?: number; cursor?: string; task_id?: number; user_id?: number } = {}) => {
+      const query = new URLSearchParams({ status });
+      Object.entries(params).forEach(([key, value]) => {
+        if (value !== undefined && value !== null) query.set(key, String(value));
+      });
+      const response = await fetch(`${API_BASE.submissions}?${query}`);
+      return response.json();
+    },
+    counts: async () => {
+      const response = await fetch(`${API_BASE.submissions}?action=counts`);
       return response.json();
     },
   },
   users: {
-    list: async () => {
-      const response = await fetch(`${API_BASE.users}?action=list`);
+    list: async (params: { limit?: number; cursor?: string; is_blocked?: boolean; level_min?: number; level_max?: number; username?: string } = {}) => {
+      const query = new URLSearchParams({ action: 'list' });
+      Object.entries(params).forEach(([key, value]) => {
+        if (value !== undefined && value !== null && value !== '') query.set(key, String(value));
+      });
+      const response = await fetch(`${API_BASE.users}?${query}`, { headers: authHeaders() });
+      return response.json();
+    },
+    leaderboard: async (limit: number = 10) => {
+      const response = await fetch(`${API_BASE.users}?action=leaderboard&limit=${limit}`);
+      return response.json();
+    },
+    stats: async () => {
+      const response = await fetch(`${API_BASE.users}?action=stats`);
+      return response.json();
+    },
+    statement: async (cursor?: string) => {
+      const query = new URLSearchParams({ action: 'statement' });
+      if (cursor) query.set('cursor', cursor);
+      const response = await fetch(`${API_BASE.users}?${query}`, { headers: authHeaders() });
+      return response.json();
+    },
+    me: async (version?: number | null, since?: number) => {
+      const query = new URLSearchParams({ action: 'me' });
+      if (version != null) query.set('version', String(version));
+      if (since) query.set('since', String(since));
+      const response = await fetch(`${API_BASE.users}?${query}`, { headers: authHeaders() });
+      if (response.status === 304) return null;
       return response.json();
     },
     block: async (user_id: number, is_blocked: boolean) => {
       const response = await fetch(API_BASE.users, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...authHeaders() },
         body: JSON.stringify({ action: 'block', user_id, is_blocked }),
       });
       return response.json();
@@ -96,18 +151,44 @@ export const api = {
     addBalance: async (user_id: number, amount: number, admin_id: number) => {
       const response = await fetch(API_BASE.users, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...authHeaders() },
         body: JSON.stringify({ action: 'add_balance', user_id, amount, admin_id }),
       });
       return response.json();
     },
-    resetAll: async () => {
+    transfer: async (data: { to_user_id?: number; to_user_code?: string; amount: number; idempotency_key: string }) => {
       const response = await fetch(API_BASE.users, {
-        method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ action: 'reset_all' }),
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', ...authHeaders() },
+        body: JSON.stringify({ action: 'transfer', ...data }),
       });
       return response.json();
     },
+    resetAll: async (onProgress?: (reset: { users_scanned: number; total_users: number }) => void) => {
+      let result;
+      do {
+        const response = await fetch(API_BASE.users, {
+          method: 'PUT',
+          headers: { 'Content-Type': 'application/json', ...authHeaders() },
+          body: JSON.stringify({ action: 'reset_all' }),
+        });
+        result = await response.json();
+        if (result.reset && onProgress) onProgress(result.reset);
+      } while (result.reset && !result.reset.done);
+      return result;
+    },
+    reconcile: async (onProgress?: (run: { users_checked: number; users_drifted: number }) => void) => {
+      let result;
+      do {
+        const response = await fetch(API_BASE.users, {
+          method: 'PUT',
+          headers: { 'Content-Type': 'application/json', ...authHeaders() },
+          body: JSON.stringify({ action: 'reconcile' }),
+        });
+        result = await response.json();
+        if (result.run && onProgress) onProgress(result.run);
+      } while (result.run && !result.run.done);
+      return result;
+    },
   },
 };
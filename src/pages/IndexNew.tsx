@@ -22,6 +22,8 @@ const Index = () => {
   
   const [currentUser, setCurrentUser] = useState<any>(null);
   const [users, setUsers] = useState<any[]>([]);
+  const [usersCursor, setUsersCursor] = useState<string | null>(null);
+  const [userSearch, setUserSearch] = useState('');
   const [tasks, setTasks] = useState<any[]>([]);
   const [submissions, setSubmissions] = useState<any[]>([]);
   const [selectedTask, setSelectedTask] = useState<any>(null);
@@ -45,17 +47,26 @@ const Index = () => {
     }
   };
 
-  const loadUsers = async () => {
+  const loadUsers = async (more: boolean = false) => {
     try {
-      const result = await api.users.list();
+      const result = await api.users.list({
+        username: userSearch.trim() || undefined,
+        cursor: more && usersCursor ? usersCursor : undefined,
+      });
       if (result.users) {
-        setUsers(result.users);
+        setUsers(more ? [...users, ...result.users] : result.users);
+        setUsersCursor(result.next_cursor ?? null);
       }
     } catch (error) {
       console.error('Error loading users:', error);
     }
   };
 
+  // правка одной строки на месте, чтобы не терять подгруженные страницы списка
+  const updateUser = (changed: any) => {
+    setUsers((current) => current.map((user) => (user.id === changed.id ? { ...user, ...changed } : user)));
+  };
+
   const loadSubmissions = async () => {
     try {
       const result = await api.submissions.list('pending');
@@ -212,12 +223,12 @@ const Index = () => {
 
   const handleBlockUser = async (userId: number, isBlocked: boolean) => {
     try {
-      await api.users.block(userId, !isBlocked);
+      const result = await api.users.block(userId, !isBlocked);
       toast({
         title: '🔒 Статус изменен',
         description: 'Статус пользователя обновлен',
       });
-      loadUsers();
+      if (result.user) updateUser(result.user);
     } catch (error) {
       toast({
         title: '❌ Ошибка',
@@ -229,12 +240,12 @@ const Index = () => {
 
   const handleAddCoins = async (userId: number, amount: number) => {
     try {
-      await api.users.addBalance(userId, amount, currentUser.id);
+      const result = await api.users.addBalance(userId, amount, currentUser.id);
       toast({
         title: '💰 Баланс пополнен',
         description: `Начислено ${amount} MegaCoin`,
       });
-      loadUsers();
+      if (result.user) updateUser(result.user);
     } catch (error) {
       toast({
         title: '❌ Ошибка',
@@ -586,6 +597,18 @@ const Index = () => {
             </TabsContent>
 
             <TabsContent value="users" className="space-y-4">
+              <div className="flex gap-2">
+                <Input
+                  placeholder="Поиск по имени пользователя"
+                  value={userSearch}
+                  onChange={(e) => setUserSearch(e.target.value)}
+                  onKeyDown={(e) => { if (e.key === 'Enter') loadUsers(); }}
+                />
+                <Button variant="outline" onClick={() => loadUsers()}>
+                  <Icon name="Search" size={16} className="mr-2" />
+                  Найти
+                </Button>
+              </div>
               {users.map((user) => (
                 <Card key={user.id} className="glass p-6">
                   <div className="flex items-center justify-between">
@@ -626,6 +649,11 @@ const Index = () => {
                   </div>
                 </Card>
               ))}
+              {usersCursor && (
+                <Button variant="outline" className="w-full" onClick={() => loadUsers(true)}>
+                  Показать ещё
+                </Button>
+              )}
             </TabsContent>
 
             <TabsContent value="actions">